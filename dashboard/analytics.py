@@ -0,0 +1,212 @@
+import argparse
+import functools
+import os
+
+import pandas as pd
+
+from config import EXECUTION_MODE
+from cube import CUBE_COLUMNS, build_order_cube, merge_order_cubes
+from data_loader import ChunkMerger, decode_ids, filter_by_order_date, iter_main_data, main_data_path, read_main_data
+from overview import OVERVIEW_COLUMNS, build_overview_index, merge_overview_indexes
+from rfm import RFM_COLUMNS, CustomerRFMPartials, create_rfm_df, score_rfm_partials
+
+# The dashboard's analytics without Streamlit: every table behind a chart is
+# a function of the order cube or of the RFM frame for one date range. The
+# charts call these same functions, and the CLI below writes them out for
+# many date ranges after a single pass over the order rows.
+ANALYTICS_COLUMNS = sorted(set(OVERVIEW_COLUMNS) | set(CUBE_COLUMNS) | set(RFM_COLUMNS))
+OUTPUT_FORMATS = ["parquet", "json"]
+
+
+def customer_city_counts(order_cube):
+    city_df = order_cube.rollup("customer_city")
+    return city_df.groupby("customer_city", observed=True).customer_count.sum().sort_values(ascending=False).reset_index()
+
+
+def customer_state_counts(order_cube):
+    state_df = order_cube.rollup("customer_state")
+    return state_df.groupby("customer_state", observed=True)[["customer_count", "revenue"]].sum().sort_values(by="customer_count", ascending=False).reset_index()
+
+
+def payment_type_usage(order_cube, approximate=False):
+    # Distinct customers per payment type: exact by default, or estimated from
+    # the cube's HyperLogLog sketches.
+    return order_cube.distinct_count("payment_type", ["payment_type"], "customer_count", approximate).sort_values(by="customer_count", ascending=False)
+
+
+def payment_type_growth(order_cube, approximate=False):
+    return order_cube.distinct_count("payment_type", ["order_year", "payment_type"], "customer_count", approximate)
+
+
+def payment_sequential_counts(order_cube):
+    payment_sequential_df = order_cube.rollup("payment_sequential")
+    return payment_sequential_df.groupby("payment_type", observed=True).payment_sequential.nunique().sort_values(ascending=False).reset_index()
+
+
+def payment_installment_counts(order_cube):
+    payment_installments_df = order_cube.rollup("payment_installments")
+    return payment_installments_df.groupby("payment_type", observed=True).payment_installments.nunique().sort_values(ascending=False).reset_index()
+
+
+def product_category_sales(order_cube):
+    product_sales = order_cube.product_sales()
+    category_df = pd.DataFrame({"product_category_name": product_sales.categories, **product_sales.category_totals})
+    return category_df.sort_values(by="customer_count", ascending=False, kind="stable", ignore_index=True)
+
+
+def review_score_counts(order_cube):
+    return order_cube.rollup("review").groupby("review_score").customer_count.sum().reset_index()
+
+
+def review_order_status_counts(order_cube):
+    return order_cube.rollup("review").groupby(["review_score", "order_status"], observed=True).order_count.sum().reset_index()
+
+
+def review_score_growth(order_cube):
+    return order_cube.rollup("review").groupby(["order_year", "review_score"]).customer_count.sum().reset_index()
+
+
+def review_category_counts(order_cube):
+    return order_cube.rollup("review").groupby("review_category").customer_count.sum().reset_index()
+
+
+def review_score_category_counts(order_cube):
+    return order_cube.rollup("review").groupby(["review_score", "review_category"]).customer_count.sum().reset_index()
+
+
+def order_status_counts(order_cube):
+    order_status_df = order_cube.rollup("order_status")
+    return order_status_df.groupby("order_status", observed=True).order_count.sum().reset_index().sort_values(by="order_count", ascending=False)
+
+
+def order_status_counts_by(order_cube, period):
+    order_status_df = order_cube.rollup("order_status")
+    return order_status_df.groupby([period, "order_status"], observed=True).order_count.sum().reset_index()
+
+
+def customer_rfm_table(rfm_df):
+    return decode_ids(rfm_df[["customer_id", "recency", "frequency", "monetary", "rfm_score", "category"]])
+
+
+def rfm_segment_counts(rfm_df):
+    return rfm_df.groupby("category").customer_id.count().reset_index()
+
+
+def rfm_summary(rfm_df):
+    return pd.DataFrame({
+        "customer_count": [len(rfm_df)],
+        "average_recency": [rfm_df["recency"].mean()],
+        "average_frequency": [rfm_df["frequency"].mean()],
+        "average_monetary": [rfm_df["monetary"].mean()],
+    })
+
+
+CUBE_REPORTS = {
+    "customer_cities": customer_city_counts,
+    "customer_states": customer_state_counts,
+    "payment_type_usage": payment_type_usage,
+    "payment_type_growth": payment_type_growth,
+    "payment_sequential": payment_sequential_counts,
+    "payment_installments": payment_installment_counts,
+    "product_categories": product_category_sales,
+    "review_scores": review_score_counts,
+    "review_order_status": review_order_status_counts,
+    "review_score_growth": review_score_growth,
+    "review_categories": review_category_counts,
+    "review_score_categories": review_score_category_counts,
+    "order_status": order_status_counts,
+    "order_status_by_year": functools.partial(order_status_counts_by, period="order_year"),
+    "order_status_by_month": functools.partial(order_status_counts_by, period="order_month"),
+    "order_status_by_day": functools.partial(order_status_counts_by, period="order_day"),
+}
+RFM_REPORTS = {
+    "rfm": customer_rfm_table,
+    "rfm_segments": rfm_segment_counts,
+    "rfm_summary": rfm_summary,
+}
+REPORTS = ["overview"] + list(CUBE_REPORTS) + list(RFM_REPORTS)
+
+
+def build_analytics(date_ranges, path=None, with_rfm=True):
+    # One pass over the order rows. The overview index and the order cube
+    # answer any date range by slicing; RFM depends on the range as a whole,
+    # so the rows of every range are aggregated during the same pass.
+    path = path or main_data_path()
+    if EXECUTION_MODE != "chunked":
+        main_df = read_main_data(path, columns=ANALYTICS_COLUMNS)
+        rfm_dfs = [create_rfm_df(filter_by_order_date(main_df, start_date, end_date)) for start_date, end_date in date_ranges] if with_rfm else None
+        return build_overview_index(main_df), build_order_cube(main_df), rfm_dfs
+
+    overview_indexes = ChunkMerger(merge_overview_indexes)
+    order_cubes = ChunkMerger(merge_order_cubes)
+    partials = [CustomerRFMPartials() for _ in date_ranges]
+    for chunk in iter_main_data(path, columns=ANALYTICS_COLUMNS):
+        overview_indexes.add(build_overview_index(chunk))
+        order_cubes.add(build_order_cube(chunk))
+        for range_partials, (start_date, end_date) in zip(partials if with_rfm else [], date_ranges):
+            range_partials.add(filter_by_order_date(chunk, start_date, end_date))
+
+    rfm_dfs = [score_rfm_partials(range_partials.to_frame()) for range_partials in partials] if with_rfm else None
+    return overview_indexes.result(), order_cubes.result(), rfm_dfs
+
+
+def run_reports(date_ranges, reports=REPORTS, path=None):
+    # One frame per report with the rows of every date range, keyed by their
+    # start_date and end_date columns.
+    overview_index, order_cube, rfm_dfs = build_analytics(date_ranges, path, with_rfm=any(name in RFM_REPORTS for name in reports))
+
+    frames = {name: [] for name in reports}
+    for i, (start_date, end_date) in enumerate(date_ranges):
+        range_cube = order_cube.between(start_date, end_date)
+        for name in reports:
+            if name == "overview":
+                report_df = pd.DataFrame([overview_index.metrics(start_date, end_date)])
+            elif name in CUBE_REPORTS:
+                report_df = CUBE_REPORTS[name](range_cube)
+            else:
+                report_df = RFM_REPORTS[name](rfm_dfs[i])
+
+            report_df = report_df.reset_index(drop=True)
+            report_df.insert(0, "end_date", pd.Timestamp(end_date))
+            report_df.insert(0, "start_date", pd.Timestamp(start_date))
+            frames[name].append(report_df)
+
+    return {name: pd.concat(report_frames, ignore_index=True) for name, report_frames in frames.items()}
+
+
+def write_reports(report_dfs, output_dir, output_format="parquet"):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, report_df in report_dfs.items():
+        path = os.path.join(output_dir, f"{name}.{output_format}")
+        if output_format == "parquet":
+            report_df.to_parquet(path, index=False)
+        else:
+            report_df.to_json(path, orient="records", date_format="iso", date_unit="s")
+        paths.append(path)
+    return paths
+
+
+def read_date_ranges(path):
+    ranges_df = pd.read_csv(path, usecols=["start_date", "end_date"], parse_dates=["start_date", "end_date"])
+    return list(ranges_df.itertuples(index=False, name=None))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the dashboard's reports for many date ranges in one pass over the order data.")
+    parser.add_argument("--range", nargs=2, action="append", default=[], metavar=("START", "END"), dest="date_ranges", help="Inclusive date range; repeat for more ranges.")
+    parser.add_argument("--ranges-file", help="CSV with start_date and end_date columns, one range per row.")
+    parser.add_argument("--reports", nargs="+", choices=REPORTS, default=REPORTS)
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="parquet", dest="output_format")
+    parser.add_argument("--path", help="Dataset to read instead of the one the dashboard reads.")
+    parser.add_argument("--output", required=True, help="Directory for one file per report.")
+    args = parser.parse_args()
+
+    date_ranges = [(pd.Timestamp(start_date), pd.Timestamp(end_date)) for start_date, end_date in args.date_ranges]
+    if args.ranges_file:
+        date_ranges += read_date_ranges(args.ranges_file)
+    if not date_ranges:
+        parser.error("give at least one --range or a --ranges-file")
+
+    for path in write_reports(run_reports(date_ranges, args.reports, args.path), args.output, args.output_format):
+        print(path)
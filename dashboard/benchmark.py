@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import charts
+from charts import CUBE_CHARTS, PRODUCT_CHARTS, RFM_CHARTS
+from cube import build_order_cube
+from data_loader import MAIN_DATA_DTYPES, convert_main_data_to_parquet, prepare_main_data, read_main_data
+from etl import MAIN_DATA_COLUMNS
+from geospatial import GEO_LEVELS, bin_customer_locations
+from overview import build_overview_index
+from rfm import create_rfm_df
+from sales import PRODUCT_MEASURES
+from tables import customer_monetary_table, customer_state_table
+
+BENCHMARK_SIZES = [100_000, 1_000_000, 10_000_000]
+BENCHMARK_REPEAT = 3
+
+# Rough shape of the real Olist data, so groupby cardinalities and top-10
+# lists scale the way they would in production.
+ORDER_STATUSES = {
+    "delivered": 0.970, "shipped": 0.011, "canceled": 0.006, "unavailable": 0.006,
+    "invoiced": 0.003, "processing": 0.003, "created": 0.0005, "approved": 0.0005,
+}
+PAYMENT_TYPES = {"credit_card": 0.74, "boleto": 0.19, "voucher": 0.055, "debit_card": 0.015}
+REVIEW_SCORES = {1: 0.11, 2: 0.03, 3: 0.08, 4: 0.19, 5: 0.59}
+N_STATES = 27
+N_CITIES = 4_000
+N_CATEGORIES = 71
+N_PRODUCTS = 33_000
+N_SELLERS = 3_100
+ROWS_PER_ORDER = 1.2
+START_DATE = "2016-09-01"
+END_DATE = "2018-10-17"
+
+
+def _hex_ids(rng, n):
+    digits = np.frombuffer(b"0123456789abcdef", dtype="S1")
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    chars = np.empty((n, 32), dtype="S1")
+    chars[:, 0::2] = digits[raw >> 4]
+    chars[:, 1::2] = digits[raw & 15]
+    return chars.view("S32").ravel().astype(str)
+
+
+def _id_column(rng, codes, n_ids):
+    # IDs are generated already dictionary encoded, the way read_main_data
+    # returns them, so 10M rows do not need tens of millions of Python strings.
+    return pd.Categorical.from_codes(codes, categories=_hex_ids(rng, n_ids))
+
+
+def _choice(rng, weights, n):
+    values = np.array(list(weights), dtype=object)
+    p = np.array(list(weights.values()), dtype=np.float64)
+    return values[rng.choice(len(values), size=n, p=p / p.sum())]
+
+
+def _zipf_codes(rng, n_values, n, exponent=1.1):
+    p = 1 / np.arange(1, n_values + 1) ** exponent
+    return rng.choice(n_values, size=n, p=p / p.sum())
+
+
+def generate_main_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    n_orders = max(int(n_rows / ROWS_PER_ORDER), 1)
+
+    # Every order gets one or more rows (items x payments), and rows are laid
+    # out in purchase order like main_data.csv after loading.
+    row_order = np.sort(np.r_[np.arange(n_orders), rng.integers(0, n_orders, n_rows - n_orders)])
+    start, end = pd.Timestamp(START_DATE).value, pd.Timestamp(END_DATE).value
+    order_timestamp = np.sort(rng.integers(start, end, n_orders)).astype("datetime64[ns]")
+    timestamp = pd.Series(order_timestamp[row_order])
+
+    n_customers = max(int(n_orders * 0.97), 1)
+    order_customer = rng.integers(0, n_customers, n_orders)
+    customer_city = _zipf_codes(rng, N_CITIES, n_customers)
+    city_state = rng.integers(0, N_STATES, N_CITIES)
+    city_lat = rng.uniform(-33, 2, N_CITIES)
+    city_lng = rng.uniform(-72, -35, N_CITIES)
+    row_customer = order_customer[row_order]
+    row_city = customer_city[row_customer]
+
+    product_category = _zipf_codes(rng, N_CATEGORIES, N_PRODUCTS)
+    row_product = _zipf_codes(rng, N_PRODUCTS, n_rows, exponent=0.8)
+    price = np.round(rng.lognormal(4.4, 1.0, n_rows), 2)
+    freight_value = np.round(rng.lognormal(2.8, 0.5, n_rows), 2)
+
+    order_review = rng.choice(list(REVIEW_SCORES), size=n_orders, p=list(REVIEW_SCORES.values()))
+    review_score = order_review[row_order]
+    review_category = np.select([review_score >= 4, review_score == 3], ["Good", "Neutral"], default="Bad")
+
+    main_df = pd.DataFrame({
+        "order_id": _id_column(rng, row_order, n_orders),
+        "customer_id": _id_column(rng, row_customer, n_customers),
+        "customer_unique_id": _id_column(rng, rng.integers(0, max(int(n_customers * 0.97), 1), n_customers)[row_customer], n_customers),
+        "customer_zip_code_prefix": (row_city * 7 % 99_999).astype(str),
+        "customer_city": pd.Categorical.from_codes(row_city, categories=[f"city_{i:04d}" for i in range(N_CITIES)]),
+        "customer_state": pd.Categorical.from_codes(city_state[row_city], categories=[f"S{i:02d}" for i in range(N_STATES)]),
+        "customer_geolocation_lat": city_lat[row_city] + rng.normal(0, 0.05, n_rows),
+        "customer_geolocation_lng": city_lng[row_city] + rng.normal(0, 0.05, n_rows),
+        "order_status": _choice(rng, ORDER_STATUSES, n_orders)[row_order],
+        "order_purchase_timestamp": timestamp,
+        "order_year": timestamp.dt.year,
+        "order_month": timestamp.dt.month_name(),
+        "order_day": timestamp.dt.day_name(),
+        "order_item_id": rng.geometric(0.85, n_rows),
+        "product_id": _id_column(rng, row_product, N_PRODUCTS),
+        "product_category_name": np.array([f"category_{i:02d}" for i in range(N_CATEGORIES)], dtype=object)[product_category[row_product]],
+        "seller_id": _id_column(rng, _zipf_codes(rng, N_SELLERS, n_rows), N_SELLERS),
+        "seller_city": "sao paulo",
+        "seller_state": "SP",
+        "price": price,
+        "freight_value": freight_value,
+        "payment_sequential": rng.geometric(0.95, n_rows),
+        "payment_type": _choice(rng, PAYMENT_TYPES, n_rows),
+        "payment_installments": rng.integers(1, 11, n_rows),
+        "payment_value": np.round(price + freight_value, 2),
+        "review_id": _id_column(rng, row_order, n_orders),
+        "review_score": review_score,
+        "review_category": review_category,
+    })
+    return main_df[MAIN_DATA_COLUMNS]
+
+
+def write_main_data(main_df, directory, seed=0):
+    # main_data.csv the way the ETL leaves it: plain hex IDs and orders in no
+    # particular sequence. The Parquet dataset is converted from it, as in
+    # production, so both reads pay for encoding the IDs.
+    rng = np.random.default_rng(seed)
+    order_codes = main_df["order_id"].cat.codes.to_numpy()
+    rows = np.argsort(rng.permutation(len(main_df["order_id"].cat.categories))[order_codes], kind="stable")
+    csv_path = os.path.join(directory, "main_data.csv")
+    main_df.iloc[rows].to_csv(csv_path, index=False)
+    return csv_path, convert_main_data_to_parquet(csv_path, os.path.join(directory, "main_data.parquet"))
+
+
+def _figure_bytes(result):
+    return len(result.to_json()) if hasattr(result, "to_json") and hasattr(result, "layout") else None
+
+
+def measure(name, func, repeat=BENCHMARK_REPEAT, setup=None):
+    # Timings come from untraced runs; tracemalloc slows allocations down, so
+    # peak memory is taken from one extra traced run. setup, when given, runs
+    # untimed before every run and its result is passed to func, for stages
+    # that modify their input.
+    seconds = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        started = time.perf_counter()
+        result = func(*args)
+        seconds.append(time.perf_counter() - started)
+
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stage = {
+        "name": name,
+        "seconds": min(seconds),
+        "mean_seconds": sum(seconds) / len(seconds),
+        "peak_memory_bytes": peak,
+    }
+    payload = _figure_bytes(result)
+    if payload is not None:
+        stage["payload_bytes"] = payload
+    return stage, result
+
+
+def run_benchmark(n_rows, repeat=BENCHMARK_REPEAT, seed=0):
+    started = time.perf_counter()
+    main_df = generate_main_data(n_rows, seed)
+    generate_seconds = time.perf_counter() - started
+
+    stages = []
+
+    def add(name, func, setup=None):
+        stage, result = measure(name, func, repeat, setup)
+        stages.append(stage)
+        return result
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, parquet_path = write_main_data(main_df, directory, seed)
+        del main_df
+        add("read_main_data[csv]", lambda: read_main_data(csv_path))
+        add("read_main_data[parquet]", lambda: read_main_data(parquet_path))
+        raw_df = pd.read_csv(csv_path, dtype=MAIN_DATA_DTYPES, parse_dates=["order_purchase_timestamp"])
+
+    main_df = add("prepare_main_data", prepare_main_data, setup=raw_df.copy)
+    del raw_df
+    rfm_df = add("create_rfm_df", lambda: create_rfm_df(main_df))
+    overview_index = add("build_overview_index", lambda: build_overview_index(main_df))
+    start_date, end_date = overview_index.days[0], overview_index.days[-1]
+    add("overview_metrics", lambda: overview_index.metrics(start_date, end_date))
+    add("overview_metrics_approximate", lambda: overview_index.metrics(start_date, end_date, approximate=True))
+    order_cube = add("build_order_cube", lambda: build_order_cube(main_df))
+    add("order_cube.between", lambda: order_cube.between(start_date, end_date))
+    add("order_cube.product_sales", lambda: order_cube.between(start_date, end_date).product_sales())
+
+    for level, detail in GEO_LEVELS.items():
+        customer_cells = add(f"bin_customer_locations[{level}]", lambda: bin_customer_locations(main_df, detail["cell_size"]))
+        customer_cells_df = add(f"customer_cells.between[{level}]", lambda: customer_cells.between(start_date, end_date))
+        add(f"visualize_geospatial[{level}]", lambda: charts.visualize_geospatial(customer_cells_df, detail["projection_scale"]))
+
+    for name in CUBE_CHARTS:
+        add(name, lambda: getattr(charts, name)(order_cube))
+    for name in PRODUCT_CHARTS:
+        for product_measure in PRODUCT_MEASURES:
+            add(f"{name}[{product_measure}]", lambda: getattr(charts, name)(order_cube.between(start_date, end_date), product_measure))
+    for name in RFM_CHARTS:
+        add(name, lambda: getattr(charts, name)(rfm_df))
+    add("customer_state_table", lambda: customer_state_table(order_cube))
+    add("customer_monetary_table", lambda: customer_monetary_table(rfm_df))
+
+    return {
+        "rows": n_rows,
+        "generate_seconds": generate_seconds,
+        "data_memory_bytes": int(main_df.memory_usage(deep=True).sum()),
+        "stages": stages,
+    }
+
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, repeat=BENCHMARK_REPEAT, seed=0):
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "repeat": repeat,
+        "seed": seed,
+        "runs": [run_benchmark(n_rows, repeat, seed) for n_rows in sizes],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the dashboard's data preparation and chart builders on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES, help="Row counts to benchmark.")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT, help="Timed runs per stage; the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
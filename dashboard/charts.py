@@ -0,0 +1,333 @@
+import threading
+
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from analytics import (
+    customer_city_counts,
+    customer_state_counts,
+    order_status_counts,
+    order_status_counts_by,
+    payment_installment_counts,
+    payment_sequential_counts,
+    payment_type_growth,
+    payment_type_usage,
+    review_category_counts,
+    review_order_status_counts,
+    review_score_category_counts,
+    review_score_counts,
+    review_score_growth,
+    rfm_segment_counts,
+)
+from data_loader import decode_ids
+from figure_cache import FIGURE_CACHE
+from geospatial import GEO_CENTER, GEO_LEVELS
+from sales import PRODUCT_MEASURES, product_details, top_products
+
+CUBE_CHARTS = [
+    "visualize_most_customer_city", "visualize_most_customer_state", "visualize_payment_method_by_usage",
+    "visualize_payment_method_by_sequential", "visualize_payment_method_by_installments",
+    "visualize_payment_method_growth", "visualize_customer_review_score", "visualize_customer_review_order_status",
+    "visualize_customer_satisification_growth", "visualize_customer_review_category",
+    "visualize_customer_review_score_category", "visualize_order_status", "visualize_order_status_by_year",
+    "visualize_order_status_by_month", "visualize_order_status_by_day",
+]
+PRODUCT_CHARTS = ["visualize_best_selling_product", "visualize_worst_selling_product"]
+PRODUCT_MEASURE_LABELS = {"customer_count": "Units Sold", "revenue": "Revenue (BRL)"}
+PRODUCT_RANKINGS = {"Units Sold": "customer_count", "Revenue": "revenue"}
+RFM_CHARTS = ["visualize_recency", "visualize_frequency", "visualize_monetary", "visualize_customer_segmentation"]
+
+
+def memoize_figure(visualize, version, filter_state):
+    # Figures are cached as JSON per dataset version and filter state; the
+    # chart inputs are derived from those two, so they are left out of the key.
+    def build(*args):
+        return FIGURE_CACHE.figure((visualize.__name__, version, filter_state), lambda: visualize(*args))
+
+    build.__name__ = visualize.__name__
+    return build
+
+
+def visualize_geospatial(customer_cells_df, projection_scale=1):
+    fig = px.scatter_geo(customer_cells_df,
+                    lat=customer_cells_df.customer_geolocation_lat,
+                    lon=customer_cells_df.customer_geolocation_lng,
+                    size="customer_count",
+                    hover_name="customer_city",
+                    hover_data={"customer_count": True})
+
+    fig.update_layout(
+        title_text="Geospatial Distribution of Customers",
+        geo_scope='south america',
+    )
+
+    if projection_scale > 1:
+        fig.update_geos(projection_scale=projection_scale, center=GEO_CENTER)
+
+    return fig
+
+def visualize_most_customer_city(order_cube):
+    customer_top10_city = customer_city_counts(order_cube).head(10).sort_values(by="customer_count")
+    colors = ['lightslategray',] * len(customer_top10_city)
+    if colors:
+        colors[-1] = 'crimson'
+
+    fig = go.Figure(data=[go.Bar(
+        x=customer_top10_city.customer_count,
+        y=customer_top10_city.customer_city,
+        marker_color=colors,
+        orientation='h',
+    )])
+
+    fig.update_layout(title_text='Top 10 Most Customer Cities')
+    return fig
+
+def visualize_most_customer_state(order_cube):
+    customer_top10_state = customer_state_counts(order_cube).head(10).sort_values(by="customer_count")
+    colors = ['lightslategray',] * len(customer_top10_state)
+    if colors:
+        colors[-1] = 'crimson'
+
+    fig = go.Figure(data=[go.Bar(
+        x=customer_top10_state.customer_count,
+        y=customer_top10_state.customer_state,
+        marker_color=colors,
+        orientation='h',
+    )])
+
+    fig.update_layout(title_text='Top 10 Most Customer States')
+    return fig
+
+
+def visualize_payment_method_by_usage(order_cube, approximate=False):
+    most_payment_type_df = payment_type_usage(order_cube, approximate)
+    fig = px.pie(most_payment_type_df, values="customer_count", names="payment_type", title="Payment Types By Usage")
+    return fig
+
+def visualize_payment_method_by_sequential(order_cube):
+    most_payment_sequential_df = payment_sequential_counts(order_cube)
+    fig = px.pie(most_payment_sequential_df, values="payment_sequential", names="payment_type", title="Payment Method By Sequential (N Times)")
+    return fig
+
+def visualize_payment_method_by_installments(order_cube):
+    most_payment_type_df = payment_installment_counts(order_cube)
+    fig = px.pie(most_payment_type_df, values="payment_installments", names="payment_type", title="Payment Method By Installments (N Times)")
+    return fig
+
+def visualize_payment_method_growth(order_cube, approximate=False):
+    payment_type_time_df = payment_type_growth(order_cube, approximate)
+
+    fig = px.line(payment_type_time_df, x='order_year', y='customer_count', color='payment_type', markers=True)
+
+    fig.update_layout(
+        title_text="Payment Method Usage Growth",
+        xaxis=dict(
+            tickmode='linear',
+            tick0=2016,
+            dtick=1
+        ),
+        xaxis_title="Year",
+        yaxis_title="Total Customer"
+    )
+   
+    return fig
+
+def visualize_best_selling_product(order_cube, measure="customer_count"):
+    product_top10_df = order_cube.product_sales().top_categories(measure, 10)
+    product_top10_df = product_top10_df.iloc[::-1]
+    colors = ['lightslategray',] * len(product_top10_df)
+    if colors:
+        colors[-1] = 'crimson'
+
+    fig = go.Figure(data=[go.Bar(
+        x=product_top10_df[measure],
+        y=product_top10_df.product_category_name,
+        marker_color=colors,
+        orientation='h',
+    )])
+
+    fig.update_layout(title_text='Top 10 Best Selling Product', xaxis_title=PRODUCT_MEASURE_LABELS[measure])
+    return fig
+
+def visualize_worst_selling_product(order_cube, measure="customer_count"):
+    product_down10_df = order_cube.product_sales().top_categories(measure, 10, largest=False)
+    colors = ['lightslategray',] * len(product_down10_df)
+    if colors:
+        colors[0] = 'crimson'
+
+    fig = go.Figure(data=[go.Bar(
+        x=product_down10_df[measure],
+        y=product_down10_df.product_category_name,
+        marker_color=colors,
+        orientation='h',
+    )])
+
+    fig.update_layout(title_text='Top 10 Worst Selling Product', xaxis_title=PRODUCT_MEASURE_LABELS[measure])
+    return fig
+
+def visualize_category_products(category_products_df, category, measure="customer_count"):
+    products_df = product_details(top_products(category_products_df, measure, 10))
+    fig = px.bar(products_df, x="product_id", y=measure, title=f"Top 10 Products in {category}", height=550, labels=PRODUCT_MEASURE_LABELS,
+                hover_data=["product_photos_qty", "product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm"])
+    fig.update_layout(xaxis_title="Product ID", yaxis_title=PRODUCT_MEASURE_LABELS[measure])
+    return fig
+
+def visualize_customer_review_score(order_cube):
+    all_reviews_df = review_score_counts(order_cube)
+    fig = px.pie(all_reviews_df, values="customer_count", names="review_score", title="Based On Review Score")
+    return fig
+
+def visualize_customer_review_order_status(order_cube):
+    review_status_df = review_order_status_counts(order_cube)
+
+    fig = px.histogram(
+        review_status_df, 
+        x="review_score", 
+        y="order_count",
+        color='order_status',
+        barmode='group',
+        height=500, 
+        title="Based on Order Status"
+    )
+
+    fig.update_layout(
+        xaxis_title="Review Score",
+        yaxis_title="Total Review"
+    )
+
+    fig.update_yaxes(type="log")
+    return fig
+
+def visualize_customer_satisification_growth(order_cube):
+    review_time_df = review_score_growth(order_cube)
+    fig = px.line(review_time_df, x='order_year', y='customer_count', color='review_score', markers=True)
+
+    fig.update_layout(
+        title_text="Customer Satisaction Growth",
+        xaxis=dict(
+            tickmode='linear',
+            tick0=2016,
+            dtick=1
+        ),
+        xaxis_title="Year",
+        yaxis_title="Total Score Review"
+    )
+
+    return fig
+
+def visualize_customer_review_category(order_cube):
+    review_category_df = review_category_counts(order_cube)
+    fig = px.pie(review_category_df, values="customer_count", names="review_category", title="Based On Review Categories")
+    return fig
+
+def visualize_customer_review_score_category(order_cube):
+    score_category_df = review_score_category_counts(order_cube)
+
+    fig = px.histogram(score_category_df, x="review_score", y="customer_count",
+                color='review_category', barmode='group',
+                height=500, title="Total Review Based on Review Score")
+
+    fig.update_layout(
+        xaxis_title="Review Score",
+        yaxis_title="Total Review"
+    )
+
+    return fig
+
+def visualize_order_status(order_cube):
+    order_status_percent_df = order_status_counts(order_cube)
+    colors = ['lightslategray',] * len(order_status_percent_df)
+    if colors:
+        colors[0] = 'crimson'
+
+    fig = go.Figure(data=[go.Bar(
+        x=order_status_percent_df.order_status,
+        y=order_status_percent_df.order_count,
+        marker_color=colors,
+    )])
+
+    fig.update_yaxes(type="log")
+    fig.update_layout(title_text='Basend On Order Status')
+    return fig
+
+def visualize_order_status_by_year(order_cube):
+    order_status_year_df = order_status_counts_by(order_cube, "order_year")
+
+    fig = px.histogram(order_status_year_df, x="order_year", y="order_count",
+                color='order_status', barmode='group',
+                height=500, title="Based On Year")
+
+    fig.update_layout(yaxis_type="log", xaxis_title="Year", yaxis_title="Total Order")
+    return fig
+
+def visualize_order_status_by_month(order_cube):
+    order_status_month_df = order_status_counts_by(order_cube, "order_month")
+    fig = px.histogram(order_status_month_df, x="order_month", y="order_count",
+                color='order_status', barmode='group',
+                height=500, title="Based On Month")
+
+    fig.update_layout(yaxis_type="log", xaxis_title="Month", yaxis_title="Total Order")
+    return fig
+
+def visualize_order_status_by_day(order_cube):
+    order_status_day_df = order_status_counts_by(order_cube, "order_day")
+
+    fig = px.histogram(order_status_day_df, x="order_day", y="order_count",
+                color='order_status', barmode='group',
+                height=500, title="Based On Day")
+
+    fig.update_layout(yaxis_type="log", xaxis_title="Day", yaxis_title="Total Order")
+    return fig
+
+def visualize_recency(rfm_df):
+    recency_df = decode_ids(rfm_df.nsmallest(10, "recency"))
+    fig = px.bar(recency_df, x="customer_id", y="recency", title="Top 10 Customer Recency", height=550)
+    fig.update_layout(xaxis_title="Customer ID", yaxis_title="Recency (Day)")
+    return fig
+
+def visualize_frequency(rfm_df):
+    frequency_df = decode_ids(rfm_df.nlargest(10, "frequency"))
+    fig = px.bar(frequency_df, x="customer_id", y="frequency", title="Top 10 Customer Frequency", height=550)
+    fig.update_layout(xaxis_title="Customer ID", yaxis_title="Frequency (N Times)")
+    return fig
+
+def visualize_monetary(rfm_df):
+    monetary_df = decode_ids(rfm_df.nlargest(10, "monetary"))
+    fig = px.bar(monetary_df, x="customer_id", y="monetary", title="Top 10 Customer Monetary", height=550)
+    fig.update_layout(xaxis_title="Customer ID", yaxis_title="Monetary (BRL)")
+    return fig
+
+def visualize_customer_segmentation(rfm_df):
+    rfm_df_count = rfm_segment_counts(rfm_df)
+    fig = px.pie(rfm_df_count, values="customer_id", names="category", title="Customer Segmentation")
+    return fig
+
+
+def warm_figure_cache(version, filter_state, order_cube, rfm_df, customer_cells):
+    start_date, end_date = filter_state
+    order_cube = order_cube.between(start_date, end_date)
+    for name in CUBE_CHARTS:
+        memoize_figure(globals()[name], version, filter_state)(order_cube)
+    for name in PRODUCT_CHARTS:
+        for measure in PRODUCT_MEASURES:
+            memoize_figure(globals()[name], version, filter_state + (measure,))(order_cube, measure)
+    for name in RFM_CHARTS:
+        memoize_figure(globals()[name], version, filter_state)(rfm_df)
+    for level, detail in GEO_LEVELS.items():
+        customer_cells_df = customer_cells[level].between(start_date, end_date)
+        memoize_figure(visualize_geospatial, version, filter_state + (level,))(customer_cells_df, detail["projection_scale"])
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def start_figure_warmup(version, filter_state, _order_cube_future, _rfm_future, _customer_cells_future):
+    # Fills the figure cache for one filter state (the full date range on
+    # startup) in a background thread once the builds it needs are done, so
+    # the first visitors of each section are served from cache.
+    thread = threading.Thread(
+        target=lambda: warm_figure_cache(version, filter_state, _order_cube_future.result(), _rfm_future.result(), _customer_cells_future.result()),
+        name="figure-warmup",
+        daemon=True,
+    )
+    thread.start()
+    return thread
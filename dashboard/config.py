@@ -0,0 +1,17 @@
+import os
+
+EXECUTION_MODES = ["memory", "chunked"]
+
+# "memory" reads every column a structure needs in one go. "chunked" streams
+# the dataset CHUNK_ROWS rows at a time and merges partial aggregates, for
+# order histories that do not fit in the dashboard container's memory.
+EXECUTION_MODE = os.environ.get("DASHBOARD_EXECUTION_MODE", "memory")
+CHUNK_ROWS = int(os.environ.get("DASHBOARD_CHUNK_ROWS", "500000"))
+
+if EXECUTION_MODE not in EXECUTION_MODES:
+    raise ValueError(f"DASHBOARD_EXECUTION_MODE must be one of {', '.join(EXECUTION_MODES)}, got {EXECUTION_MODE!r}")
+
+# Derived structures (overview index, order cube, customer cells, RFM) are
+# written here after they are built and memory mapped on the next launch of
+# the same dataset. An empty value turns snapshots off.
+SNAPSHOT_DIR = os.environ.get("DASHBOARD_SNAPSHOT_DIR", "dashboard/snapshots")
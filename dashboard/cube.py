@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_loader import ChunkMerger, dataset_version, main_data_path, order_date_range
+from parallel import submit_build
+from sales import build_product_sales
+from sketches import distinct_group_codes, estimate_cardinality, hll_registers, merge_registers
+
+# Every rollup is keyed by the purchase day plus its own dimensions, with the
+# measures summed per cell. Rollups with a distinct column also keep the set
+# of that column's value codes seen in each cell, for exact distinct counts
+# over any group of cells, and one HyperLogLog sketch per cell for the
+# approximate ones.
+CUBE_ROLLUPS = {
+    "customer_city": {
+        "dimensions": ["customer_city"],
+        "measures": {"customer_count": ("customer_id", "count")},
+    },
+    "customer_state": {
+        "dimensions": ["customer_state"],
+        "measures": {"customer_count": ("customer_id", "count"), "revenue": ("payment_value", "sum")},
+    },
+    "product_category_name": {
+        "dimensions": ["product_category_name"],
+        "measures": {"customer_count": ("customer_id", "count"), "revenue": ("payment_value", "sum")},
+    },
+    "payment_type": {
+        "dimensions": ["order_year", "payment_type"],
+        "measures": {"customer_count": ("customer_id", "count"), "payment_value": ("payment_value", "sum")},
+        "distinct": "customer_id",
+    },
+    "payment_sequential": {
+        "dimensions": ["payment_type", "payment_sequential"],
+        "measures": {"payment_count": ("payment_type", "size")},
+    },
+    "payment_installments": {
+        "dimensions": ["payment_type", "payment_installments"],
+        "measures": {"payment_count": ("payment_type", "size")},
+    },
+    "review": {
+        "dimensions": ["order_year", "review_score", "review_category", "order_status"],
+        "measures": {"customer_count": ("customer_id", "count"), "order_count": ("order_id", "count")},
+    },
+    "order_status": {
+        "dimensions": ["order_year", "order_month", "order_day", "order_status"],
+        "measures": {"order_count": ("order_id", "count")},
+    },
+}
+
+CUBE_COLUMNS = sorted({"order_purchase_timestamp"} | {
+    column
+    for rollup in CUBE_ROLLUPS.values()
+    for column in rollup["dimensions"] + [source for source, _ in rollup["measures"].values()] + [rollup.get("distinct")]
+    if column is not None
+})
+
+
+class OrderCube:
+    # Rollup rows (and their sketch rows and distinct codes) are sorted by
+    # order_date, so the cube for any date range is a contiguous slice of
+    # every rollup and is as cheap to take as the unfiltered cube. Like the
+    # overview index, distinct_values maps the codes back to values so that
+    # cubes built over separate chunks of the data can be merged.
+    def __init__(self, rollups, sketches, distinct_codes, distinct_values):
+        self.rollups = rollups
+        self.sketches = sketches
+        self.distinct_codes = distinct_codes
+        self.distinct_values = distinct_values
+        self._product_sales = None
+
+    def rollup(self, name):
+        return self.rollups[name]
+
+    def between(self, start_date, end_date):
+        rollups = {}
+        sketches = {}
+        distinct_codes = {}
+        for name, rollup_df in self.rollups.items():
+            lo, hi = order_date_range(rollup_df["order_date"].to_numpy(), start_date, end_date)
+            rollups[name] = rollup_df.iloc[lo:hi]
+            if name in self.sketches:
+                sketches[name] = self.sketches[name][lo:hi]
+            if name in self.distinct_codes:
+                cell_offsets, codes = self.distinct_codes[name]
+                distinct_codes[name] = (cell_offsets[lo:hi + 1] - cell_offsets[lo], codes[cell_offsets[lo]:cell_offsets[hi]])
+        return OrderCube(rollups, sketches, distinct_codes, self.distinct_values)
+
+    def product_sales(self):
+        # Summed once per cube and shared by the best and worst selling
+        # rankings of this date range.
+        if self._product_sales is None:
+            self._product_sales = build_product_sales(self.rollups["product_category_name"])
+        return self._product_sales
+
+    def distinct_count(self, name, by, column="distinct_count", approximate=False):
+        rollup_df = self.rollups[name]
+        grouped = rollup_df.groupby(by, observed=True)
+        group_codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+        distinct_df = grouped.size().reset_index()[by]
+        if approximate:
+            registers = merge_registers(self.sketches[name], group_codes, grouped.ngroups)
+            distinct_df[column] = np.rint(estimate_cardinality(registers)).astype("int64")
+        else:
+            cell_offsets, codes = self.distinct_codes[name]
+            group_offsets, _ = distinct_group_codes(np.repeat(group_codes, np.diff(cell_offsets)), codes, grouped.ngroups, len(self.distinct_values[name]))
+            distinct_df[column] = np.diff(group_offsets)
+        return distinct_df
+
+
+def build_order_cube(main_df):
+    order_date = main_df["order_purchase_timestamp"].dt.normalize().rename("order_date")
+
+    rollups = {}
+    sketches = {}
+    distinct_codes = {}
+    distinct_values = {}
+    for name, rollup in CUBE_ROLLUPS.items():
+        keys = [order_date] + [main_df[dimension] for dimension in rollup["dimensions"]]
+        grouped = main_df.groupby(keys, observed=True, dropna=False)
+        rollups[name] = grouped.agg(**rollup["measures"]).reset_index()
+
+        if "distinct" in rollup:
+            cell_codes = grouped.ngroup().to_numpy()
+            codes, uniques = pd.factorize(main_df[rollup["distinct"]])
+            distinct_codes[name] = distinct_group_codes(cell_codes, codes, grouped.ngroups, len(uniques))
+            distinct_values[name] = np.asarray(uniques, dtype=object)
+            sketches[name] = hll_registers(main_df[rollup["distinct"]], cell_codes, grouped.ngroups)
+
+    return OrderCube(rollups, sketches, distinct_codes, distinct_values)
+
+
+def merge_order_cubes(cubes):
+    # Cubes built over disjoint sets of rows merge cell by cell: every measure
+    # is a count or a sum, so it adds up, distinct value sets are re-coded
+    # against the union of their values and sketches take the register-wise
+    # maximum.
+    rollups = {}
+    sketches = {}
+    distinct_codes = {}
+    distinct_values = {}
+    for name, rollup in CUBE_ROLLUPS.items():
+        rollup_df = pd.concat([cube.rollups[name] for cube in cubes], ignore_index=True)
+        grouped = rollup_df.groupby(["order_date"] + rollup["dimensions"], observed=True, dropna=False)
+        rollups[name] = grouped[list(rollup["measures"])].sum().reset_index()
+
+        if "distinct" in rollup:
+            cell_codes = grouped.ngroup().to_numpy()
+            global_codes, values = pd.factorize(np.concatenate([cube.distinct_values[name] for cube in cubes]))
+            value_offsets = np.cumsum([0] + [len(cube.distinct_values[name]) for cube in cubes])
+            row_offsets = np.cumsum([0] + [len(cube.rollups[name]) for cube in cubes])
+            merged_cells, merged_codes = [], []
+            for cube, row_offset, value_offset in zip(cubes, row_offsets, value_offsets):
+                cube_offsets, cube_codes = cube.distinct_codes[name]
+                merged_cells.append(np.repeat(cell_codes[row_offset:row_offset + len(cube.rollups[name])], np.diff(cube_offsets)))
+                merged_codes.append(global_codes[value_offset + cube_codes])
+            distinct_codes[name] = distinct_group_codes(np.concatenate(merged_cells), np.concatenate(merged_codes), grouped.ngroups, len(values))
+            distinct_values[name] = np.asarray(values, dtype=object)
+
+            registers = np.concatenate([cube.sketches[name] for cube in cubes])
+            sketches[name] = merge_registers(registers, cell_codes, grouped.ngroups)
+
+    return OrderCube(rollups, sketches, distinct_codes, distinct_values)
+
+
+def build_order_cube_chunked(chunks):
+    merger = ChunkMerger(merge_order_cubes)
+    for chunk in chunks:
+        merger.add(build_order_cube(chunk))
+    return merger.result()
+
+
+def prefetch_order_cube(path=None):
+    path = path or main_data_path()
+    return submit_build(build_order_cube, path, dataset_version(path), CUBE_COLUMNS, build_order_cube_chunked)
+
+
+def load_order_cube(path=None):
+    with st.spinner("Building aggregates..."):
+        return prefetch_order_cube(path).result()
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import streamlit as st
+
+from config import CHUNK_ROWS, SNAPSHOT_DIR
+
+MAIN_DATA_PATH = "dashboard/main_data.csv"
+MAIN_DATA_PARQUET_PATH = "dashboard/main_data.parquet"
+PARTITION_COLUMN = "order_year"
+
+list_month = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+list_day = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+ID_COLUMNS = ["order_id", "customer_id", "customer_unique_id", "seller_id", "product_id", "review_id"]
+
+MAIN_DATA_DTYPES = {
+    "customer_city": "category",
+    "customer_state": "category",
+    "payment_type": "category",
+    "order_status": "category",
+    "review_score": "Int8",
+    "order_month": pd.CategoricalDtype(categories=list_month, ordered=True),
+    "order_day": pd.CategoricalDtype(categories=list_day, ordered=True),
+}
+
+FILE_HASHES_NAME = "file_hashes.json"
+
+_file_hashes = None
+
+
+def _load_file_hashes():
+    # Hashes are kept next to the snapshots, so a freshly started process
+    # maps the snapshots of an unchanged dataset without reading all of it
+    # to hash it first.
+    if not SNAPSHOT_DIR:
+        return {}
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, FILE_HASHES_NAME)) as f:
+            return {(path, mtime_ns, size): digest for path, mtime_ns, size, digest in json.load(f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_file_hash(key, digest):
+    if not SNAPSHOT_DIR:
+        return
+    # Merged into what is on disk now, since other processes save theirs
+    # too; hashes of older versions of the same file are dropped.
+    file_hashes = {other: value for other, value in _load_file_hashes().items() if other[0] != key[0]}
+    file_hashes[key] = digest
+    path = os.path.join(SNAPSHOT_DIR, FILE_HASHES_NAME)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(temp_path, "w") as f:
+            json.dump([[*other, value] for other, value in file_hashes.items()], f)
+        os.replace(temp_path, path)
+    except OSError:
+        # A read-only or full disk only costs the next process a rehash.
+        pass
+
+
+def file_version(path):
+    # The hash is only recomputed when mtime or size change, so checking the
+    # version on every rerun costs a single stat call.
+    global _file_hashes
+    if _file_hashes is None:
+        _file_hashes = _load_file_hashes()
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+        _save_file_hash(key, _file_hashes[key])
+    return f"{stat.st_mtime_ns}-{_file_hashes[key]}"
+
+
+def dataset_version(path):
+    if not os.path.isdir(path):
+        return file_version(path)
+
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_version(file_path).encode())
+    return digest.hexdigest()
+
+
+def encode_ids(df, columns=ID_COLUMNS):
+    # 32-character hex keys are dictionary encoded after loading: the column
+    # keeps int32 codes and each distinct ID string is stored once, so
+    # groupbys, joins and hashing work on the codes. Categories are left
+    # unsorted because sorting millions of hex strings costs more than the
+    # encoding itself. IDs stay plain strings on disk.
+    for column in columns:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            codes, uniques = pd.factorize(df[column])
+            df[column] = pd.Categorical.from_codes(codes, categories=uniques)
+    return df
+
+
+def decode_ids(df, columns=ID_COLUMNS):
+    # Back to plain hex strings, only for the handful of rows that get displayed.
+    return df.assign(**{column: df[column].astype(str) for column in columns if column in df.columns})
+
+
+def _apply_dtypes(df):
+    for column, dtype in MAIN_DATA_DTYPES.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    if PARTITION_COLUMN in df.columns:
+        # Hive partition keys come back from parquet as a categorical.
+        df[PARTITION_COLUMN] = df[PARTITION_COLUMN].astype("int16")
+    return encode_ids(df)
+
+
+def _csv_options(columns, years):
+    usecols = None
+    if columns is not None:
+        usecols = list(columns)
+        if years is not None and PARTITION_COLUMN not in usecols:
+            usecols.append(PARTITION_COLUMN)
+
+    parse_dates = ["order_purchase_timestamp"]
+    if usecols is not None and "order_purchase_timestamp" not in usecols:
+        parse_dates = None
+    return {"usecols": usecols, "dtype": MAIN_DATA_DTYPES, "parse_dates": parse_dates}
+
+
+def _select_years(df, columns, years):
+    if years is not None:
+        df = df[df[PARTITION_COLUMN].isin(years)].reset_index(drop=True)
+    if columns is not None and PARTITION_COLUMN not in columns and PARTITION_COLUMN in df.columns:
+        df = df.drop(columns=PARTITION_COLUMN)
+    return df
+
+
+def _read_csv(path, columns, years):
+    return _select_years(pd.read_csv(path, **_csv_options(columns, years)), columns, years)
+
+
+def _read_parquet(path, columns, years):
+    filters = None
+    if years is not None:
+        filters = [(PARTITION_COLUMN, "in", list(years))]
+    return pd.read_parquet(path, columns=None if columns is None else list(columns), filters=filters)
+
+
+def prepare_main_data(df):
+    df = _apply_dtypes(df)
+
+    # Keeping rows in purchase order lets filter_by_order_date binary search
+    # the timestamp column instead of scanning it.
+    if "order_purchase_timestamp" in df.columns and not df["order_purchase_timestamp"].is_monotonic_increasing:
+        df = df.sort_values("order_purchase_timestamp", kind="stable", ignore_index=True)
+    return df
+
+
+def read_main_data(path, columns=None, years=None):
+    if os.path.isdir(path):
+        df = _read_parquet(path, columns, years)
+    else:
+        df = _read_csv(path, columns, years)
+    return prepare_main_data(df)
+
+
+def _iter_csv(path, columns, years, chunk_rows):
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, **_csv_options(columns, years)):
+        yield _select_years(chunk, columns, years)
+
+
+def _iter_parquet(path, columns, years, chunk_rows):
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    row_filter = None
+    if years is not None:
+        row_filter = ds.field(PARTITION_COLUMN).isin(list(years))
+    for batch in dataset.to_batches(columns=None if columns is None else list(columns), filter=row_filter, batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def iter_main_data(path, columns=None, years=None, chunk_rows=CHUNK_ROWS):
+    # Streams the dataset in chunks of at most chunk_rows rows, each prepared
+    # like read_main_data's frame. Chunks are independent: dictionary encoded
+    # IDs use different codes in every chunk.
+    if os.path.isdir(path):
+        chunks = _iter_parquet(path, columns, years, chunk_rows)
+    else:
+        chunks = _iter_csv(path, columns, years, chunk_rows)
+    for chunk in chunks:
+        if len(chunk):
+            yield prepare_main_data(chunk)
+
+
+class IdDictionary:
+    # Codes for ID values that stay the same from chunk to chunk, where
+    # encode_ids starts over in every chunk. A chunk only looks up its own
+    # distinct IDs; codes run in the order the IDs were first seen.
+    def __init__(self):
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def encode(self, ids):
+        # Missing IDs get code -1, like pd.factorize gives them.
+        chunk_codes, uniques = pd.factorize(ids)
+        codes = self.codes
+        unique_codes = np.fromiter((codes.setdefault(value, len(codes)) for value in uniques), dtype=np.int64, count=len(uniques))
+        return np.append(unique_codes, -1)[chunk_codes]
+
+    def categories(self):
+        return pd.Index(list(self.codes), dtype=object)
+
+
+class ChunkMerger:
+    # Merges the partial aggregates of successive chunks pairwise, like a
+    # binary counter: a partial is only merged with one of the same level,
+    # so every chunk's rows are regrouped about log2(chunks) times instead
+    # of the whole running result being regrouped once per chunk.
+    def __init__(self, merge):
+        self.merge = merge
+        self.levels = []
+
+    def add(self, partial):
+        level = 0
+        while self.levels and self.levels[-1][0] == level:
+            partial = self.merge([self.levels.pop()[1], partial])
+            level += 1
+        self.levels.append((level, partial))
+
+    def result(self):
+        # None when no partial was added.
+        if len(self.levels) <= 1:
+            return self.levels[0][1] if self.levels else None
+        return self.merge([partial for _, partial in self.levels])
+
+
+@st.cache_resource(max_entries=32, show_spinner="Loading order data...")
+def _load_main_data(path, version, columns, years):
+    return read_main_data(path, columns, years)
+
+
+def main_data_path():
+    if os.path.isdir(MAIN_DATA_PARQUET_PATH):
+        return MAIN_DATA_PARQUET_PATH
+    return MAIN_DATA_PATH
+
+
+def load_main_data(columns=None, years=None, path=None):
+    # cache_resource hands back the same frame on every rerun instead of a
+    # copy. Each (columns, years) projection is cached separately so a section
+    # only pays for the columns and order_year partitions it actually reads.
+    path = path or main_data_path()
+    version = dataset_version(path)
+    if columns is not None:
+        columns = tuple(columns)
+    if years is not None:
+        years = tuple(sorted(set(years)))
+    return _load_main_data(path, version, columns, years), version
+
+
+def order_date_range(order_dates, start_date, end_date):
+    # Positions bounding start_date..end_date in a sorted array of dates or
+    # timestamps. The end date is inclusive, so every order placed on that
+    # day is kept.
+    start = np.datetime64(pd.Timestamp(start_date))
+    end = np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1))
+    return np.searchsorted(order_dates, start), np.searchsorted(order_dates, end)
+
+
+def filter_by_order_date(df, start_date, end_date):
+    # Expects df sorted by order_purchase_timestamp, as read_main_data returns
+    # it, and slices it without copying.
+    lo, hi = order_date_range(df["order_purchase_timestamp"].to_numpy(), start_date, end_date)
+    return df.iloc[lo:hi]
+
+
+def convert_main_data_to_parquet(csv_path=MAIN_DATA_PATH, parquet_path=MAIN_DATA_PARQUET_PATH):
+    df = pd.read_csv(csv_path, dtype=MAIN_DATA_DTYPES, parse_dates=["order_purchase_timestamp"])
+    df = df.sort_values("order_purchase_timestamp", kind="stable", ignore_index=True)
+
+    if os.path.isdir(parquet_path):
+        shutil.rmtree(parquet_path)
+    df.to_parquet(parquet_path, engine="pyarrow", partition_cols=[PARTITION_COLUMN], index=False)
+    return parquet_path
+
+
+if __name__ == "__main__":
+    print(f"Written {convert_main_data_to_parquet()}")
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_loader import MAIN_DATA_PARQUET_PATH, MAIN_DATA_PATH, convert_main_data_to_parquet
+
+RAW_DATA_DIR = "data"
+
+RAW_TABLES = {
+    "customers": "customers_dataset.csv",
+    "geolocation": "geolocation_dataset.csv",
+    "orders": "orders_dataset.csv",
+    "order_items": "order_items_dataset.csv",
+    "order_payments": "order_payments_dataset.csv",
+    "order_reviews": "order_reviews_dataset.csv",
+    "products": "products_dataset.csv",
+    "sellers": "sellers_dataset.csv",
+    "category_translation": "product_category_name_translation.csv",
+}
+
+# Tables keyed by order_id are the ones that grow with the order history, so
+# they are streamed in chunks and hash partitioned on order_id. Olist's
+# customers table grows with them too (every order gets its own customer_id),
+# so it is partitioned alongside the orders. Every other table is a small
+# dimension that is held in memory for the whole run.
+ORDER_TABLE_COLUMNS = {
+    "orders": ["order_id", "customer_id", "order_status", "order_purchase_timestamp"],
+    "order_items": ["order_id", "order_item_id", "product_id", "seller_id", "price", "freight_value"],
+    "order_payments": ["order_id", "payment_sequential", "payment_type", "payment_installments", "payment_value"],
+    "order_reviews": ["order_id", "review_id", "review_score"],
+}
+CUSTOMER_COLUMNS = ["customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city", "customer_state"]
+
+MAIN_DATA_COLUMNS = [
+    "order_id", "customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city", "customer_state",
+    "customer_geolocation_lat", "customer_geolocation_lng", "order_status", "order_purchase_timestamp",
+    "order_year", "order_month", "order_day", "order_item_id", "product_id", "product_category_name",
+    "seller_id", "seller_city", "seller_state", "price", "freight_value", "payment_sequential", "payment_type",
+    "payment_installments", "payment_value", "review_id", "review_score", "review_category",
+]
+
+# Left joins leave these columns with missing values, which would otherwise
+# turn them into floats in the output.
+INTEGER_DTYPES = {"order_item_id": "Int16", "payment_sequential": "Int16", "payment_installments": "Int16", "review_score": "Int8"}
+
+ZIP_CODE_DTYPES = {"customer_zip_code_prefix": str, "seller_zip_code_prefix": str, "geolocation_zip_code_prefix": str}
+
+ETL_CHUNKSIZE = 200_000
+ETL_BUCKETS = 16
+
+
+def raw_table_path(raw_dir, table):
+    return os.path.join(raw_dir, RAW_TABLES[table])
+
+
+def etl_state_path(output_path):
+    return f"{output_path}.etl.json"
+
+
+def built_orders_path(output_path):
+    return f"{output_path}.etl.orders"
+
+
+def check_raw_tables(raw_dir):
+    missing = [name for name in RAW_TABLES.values() if not os.path.exists(os.path.join(raw_dir, name))]
+    if missing:
+        raise FileNotFoundError(f"Missing raw Olist tables in {raw_dir}: {', '.join(missing)}")
+
+
+def review_category(review_score):
+    return pd.Series(
+        np.select([review_score >= 4, review_score == 3, review_score <= 2], ["Good", "Neutral", "Bad"], default=None),
+        index=review_score.index,
+    )
+
+
+def load_dimensions(raw_dir, chunksize=ETL_CHUNKSIZE):
+    # The geolocation table holds many points per zip code prefix; only the
+    # running sum and count per prefix are kept while streaming it.
+    geolocation = None
+    for chunk in pd.read_csv(raw_table_path(raw_dir, "geolocation"), dtype=ZIP_CODE_DTYPES, chunksize=chunksize,
+                             usecols=["geolocation_zip_code_prefix", "geolocation_lat", "geolocation_lng"]):
+        partial = chunk.groupby("geolocation_zip_code_prefix").agg(
+            lat_sum=("geolocation_lat", "sum"),
+            lng_sum=("geolocation_lng", "sum"),
+            points=("geolocation_lat", "count"),
+        )
+        geolocation = partial if geolocation is None else geolocation.add(partial, fill_value=0)
+
+    geolocation = pd.DataFrame({
+        "customer_geolocation_lat": geolocation["lat_sum"] / geolocation["points"],
+        "customer_geolocation_lng": geolocation["lng_sum"] / geolocation["points"],
+    }).rename_axis("customer_zip_code_prefix").reset_index()
+
+    translation = pd.read_csv(raw_table_path(raw_dir, "category_translation"), encoding="utf-8-sig")
+    products = pd.read_csv(raw_table_path(raw_dir, "products"), usecols=["product_id", "product_category_name"])
+    products = products.merge(translation, on="product_category_name", how="left")
+    products["product_category_name"] = products.pop("product_category_name_english").fillna(products["product_category_name"])
+
+    sellers = pd.read_csv(raw_table_path(raw_dir, "sellers"), usecols=["seller_id", "seller_city", "seller_state"])
+    return geolocation, products, sellers
+
+
+def write_partitions(df, partition_dir, name, keys, buckets):
+    bucket = pd.util.hash_pandas_object(keys, index=False).to_numpy() % buckets
+    for b, bucket_df in df.groupby(bucket):
+        path = os.path.join(partition_dir, f"{name}_{b}.csv")
+        bucket_df.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+def read_partition(partition_dir, name, bucket, columns):
+    path = os.path.join(partition_dir, f"{name}_{bucket}.csv")
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(path, dtype=ZIP_CODE_DTYPES)
+
+
+def partition_order_tables(raw_dir, partition_dir, built_order_ids=None, buckets=ETL_BUCKETS, chunksize=ETL_CHUNKSIZE):
+    # Grace hash partitioning: every order table is split into the same
+    # buckets by hash(order_id), so one bucket of each table holds every row
+    # of the orders in that bucket and can be joined on its own. Customers
+    # are keyed by customer_id instead, so orders and customers are first
+    # partitioned on customer_id and joined bucket by bucket, and the joined
+    # orders are then partitioned on order_id like the other tables.
+    # Orders in built_order_ids are skipped. Returns the order_ids that were
+    # partitioned.
+    new_order_ids, new_customer_ids = set(), set()
+    for chunk in pd.read_csv(raw_table_path(raw_dir, "orders"), usecols=ORDER_TABLE_COLUMNS["orders"], chunksize=chunksize):
+        if built_order_ids is not None:
+            chunk = chunk[~chunk["order_id"].isin(built_order_ids)]
+        new_order_ids.update(chunk["order_id"])
+        new_customer_ids.update(chunk["customer_id"])
+        write_partitions(chunk, partition_dir, "customer_orders", chunk["customer_id"], buckets)
+
+    for chunk in pd.read_csv(raw_table_path(raw_dir, "customers"), usecols=CUSTOMER_COLUMNS, dtype=ZIP_CODE_DTYPES, chunksize=chunksize):
+        if built_order_ids is not None:
+            chunk = chunk[chunk["customer_id"].isin(new_customer_ids)]
+        write_partitions(chunk, partition_dir, "customers", chunk["customer_id"], buckets)
+
+    for bucket in range(buckets):
+        orders = read_partition(partition_dir, "customer_orders", bucket, ORDER_TABLE_COLUMNS["orders"])
+        customers = read_partition(partition_dir, "customers", bucket, CUSTOMER_COLUMNS)
+        orders = orders.merge(customers, on="customer_id", how="left")
+        write_partitions(orders, partition_dir, "orders", orders["order_id"], buckets)
+
+    for table, columns in ORDER_TABLE_COLUMNS.items():
+        if table == "orders":
+            continue
+        for chunk in pd.read_csv(raw_table_path(raw_dir, table), usecols=columns, chunksize=chunksize):
+            if built_order_ids is not None:
+                chunk = chunk[chunk["order_id"].isin(new_order_ids)]
+            write_partitions(chunk, partition_dir, table, chunk["order_id"], buckets)
+    return new_order_ids
+
+
+def build_bucket(partition_dir, bucket, geolocation, products, sellers):
+    orders = read_partition(partition_dir, "orders", bucket, ORDER_TABLE_COLUMNS["orders"] + CUSTOMER_COLUMNS[1:])
+    if orders.empty:
+        return None
+
+    main_df = orders.merge(geolocation, on="customer_zip_code_prefix", how="left")
+    main_df = main_df.merge(read_partition(partition_dir, "order_items", bucket, ORDER_TABLE_COLUMNS["order_items"]), on="order_id", how="left")
+    main_df = main_df.merge(products, on="product_id", how="left")
+    main_df = main_df.merge(sellers, on="seller_id", how="left")
+    main_df = main_df.merge(read_partition(partition_dir, "order_payments", bucket, ORDER_TABLE_COLUMNS["order_payments"]), on="order_id", how="left")
+    main_df = main_df.merge(read_partition(partition_dir, "order_reviews", bucket, ORDER_TABLE_COLUMNS["order_reviews"]), on="order_id", how="left")
+
+    order_purchase_timestamp = pd.to_datetime(main_df["order_purchase_timestamp"])
+    main_df["order_purchase_timestamp"] = order_purchase_timestamp
+    main_df["order_year"] = order_purchase_timestamp.dt.year
+    main_df["order_month"] = order_purchase_timestamp.dt.month_name()
+    main_df["order_day"] = order_purchase_timestamp.dt.day_name()
+    main_df["review_category"] = review_category(main_df["review_score"])
+    return main_df[MAIN_DATA_COLUMNS].astype(INTEGER_DTYPES)
+
+
+def read_etl_state(output_path):
+    state_path = etl_state_path(output_path)
+    if not all(os.path.exists(path) for path in [state_path, output_path, built_orders_path(output_path)]):
+        return None
+    with open(state_path) as f:
+        state = json.load(f)
+    # A state without the size of the built orders file predates it and
+    # cannot say which orders the output holds.
+    return state if "orders_size" in state else None
+
+
+def read_built_order_ids(output_path, size):
+    # Only the part recorded by the last run that finished; anything after it
+    # is left over from an interrupted run.
+    with open(built_orders_path(output_path), "rb") as f:
+        return set(f.read(size).decode().split())
+
+
+def write_etl_state(output_path, state):
+    state_path = etl_state_path(output_path)
+    with open(f"{state_path}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def append_rows(rows_path, output_path, size):
+    # The output is first cut back to the size recorded by the last run that
+    # finished, so the rows of an append that was interrupted are dropped
+    # rather than kept twice; the next run rebuilds those orders anyway, as
+    # they only count as built once the append is recorded.
+    with open(output_path, "r+b") as output, open(rows_path, "rb") as rows:
+        output.truncate(size)
+        output.seek(size)
+        shutil.copyfileobj(rows, output)
+    return os.path.getsize(output_path)
+
+
+def build_main_data(raw_dir=RAW_DATA_DIR, output_path=MAIN_DATA_PATH, incremental=False, buckets=ETL_BUCKETS, chunksize=ETL_CHUNKSIZE):
+    # Incremental runs only pick up orders that no earlier build included,
+    # whenever they were purchased, and append them; the order_ids of every
+    # build are recorded next to the output for that. Changes to orders that
+    # were already built (status updates, late reviews) need a full rebuild.
+    # Either way the new rows go to a temporary file first and only reach
+    # output_path once every bucket has been built.
+    check_raw_tables(raw_dir)
+    state = read_etl_state(output_path) if incremental else None
+    built_order_ids = read_built_order_ids(output_path, state["orders_size"]) if state else None
+
+    geolocation, products, sellers = load_dimensions(raw_dir, chunksize)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    target_path = tempfile.NamedTemporaryFile(dir=output_dir, suffix=".csv", delete=False).name
+    orders_path = tempfile.NamedTemporaryFile(dir=output_dir, suffix=".orders", delete=False).name
+    header = state is None
+
+    rows = 0
+    try:
+        with tempfile.TemporaryDirectory() as partition_dir:
+            new_order_ids = partition_order_tables(raw_dir, partition_dir, built_order_ids, buckets, chunksize)
+            for bucket in range(buckets):
+                main_df = build_bucket(partition_dir, bucket, geolocation, products, sellers)
+                if main_df is None:
+                    continue
+
+                main_df.to_csv(target_path, mode="a", header=header, index=False)
+                header = False
+                rows += len(main_df)
+
+        with open(orders_path, "w") as f:
+            f.writelines(f"{order_id}\n" for order_id in sorted(new_order_ids))
+
+        if state is None:
+            # A state left behind would describe the file being replaced.
+            if os.path.exists(etl_state_path(output_path)):
+                os.remove(etl_state_path(output_path))
+            os.replace(target_path, output_path)
+            os.replace(orders_path, built_orders_path(output_path))
+            size = os.path.getsize(output_path)
+            orders_size = os.path.getsize(built_orders_path(output_path))
+        else:
+            size = append_rows(target_path, output_path, state["size"])
+            orders_size = append_rows(orders_path, built_orders_path(output_path), state["orders_size"])
+    finally:
+        for path in [target_path, orders_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    write_etl_state(output_path, {
+        "rows": rows + (state["rows"] if state else 0),
+        "size": size,
+        "orders_size": orders_size,
+    })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build dashboard/main_data.csv from the raw Olist tables.")
+    parser.add_argument("--raw-dir", default=RAW_DATA_DIR)
+    parser.add_argument("--output", default=MAIN_DATA_PATH)
+    parser.add_argument("--incremental", action="store_true", help="Only append orders that the last build did not include.")
+    parser.add_argument("--buckets", type=int, default=ETL_BUCKETS)
+    parser.add_argument("--chunksize", type=int, default=ETL_CHUNKSIZE)
+    parser.add_argument("--parquet", action="store_true", help="Also rewrite the partitioned Parquet dataset. It is always rewritten when it exists and --output is the dashboard's CSV.")
+    args = parser.parse_args()
+
+    rows = build_main_data(args.raw_dir, args.output, args.incremental, args.buckets, args.chunksize)
+    print(f"Written {rows} rows to {args.output}")
+    # The dashboard reads the Parquet dataset instead of the CSV whenever it
+    # exists, so one converted from the previous CSV would hide the new rows.
+    if args.parquet or (os.path.abspath(args.output) == os.path.abspath(MAIN_DATA_PATH) and os.path.isdir(MAIN_DATA_PARQUET_PATH)):
+        print(f"Written {convert_main_data_to_parquet(args.output)}")
@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class FigureCache:
+    # Serialized Plotly JSON keyed by chart id, dataset version and filter
+    # state, shared by every session of the server. Once the stored JSON
+    # outgrows max_bytes the least recently used figures are evicted. A hit
+    # only parses JSON, so it never touches pandas.
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            figure_json = self.entries.get(key)
+            if figure_json is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return figure_json
+
+    def put(self, key, figure_json):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = figure_json
+            self.size += len(figure_json)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def figure(self, key, build):
+        figure_json = self.get(key)
+        if figure_json is not None:
+            return pio.from_json(figure_json, skip_invalid=True)
+
+        fig = build()
+        self.put(key, fig.to_json())
+        return fig
+
+
+FIGURE_CACHE = FigureCache()
@@ -0,0 +1,92 @@
+import decimal
+import functools
+
+import numpy as np
+from babel import Locale
+from babel.numbers import get_currency_symbol, get_decimal_symbol, get_group_symbol, parse_pattern
+
+LOCALE = "pt_BR"
+CURRENCY = "BRL"
+MISSING_VALUE = "-"
+
+
+@functools.lru_cache(maxsize=None)
+def _separators(locale):
+    # Python formats numbers as "1,234.56"; one translate swaps in the
+    # locale's group and decimal symbols.
+    return str.maketrans({",": get_group_symbol(locale), ".": get_decimal_symbol(locale)})
+
+
+@functools.lru_cache(maxsize=None)
+def currency_pattern(currency=CURRENCY, locale=LOCALE):
+    # Looking up and parsing the locale's currency pattern is what makes
+    # babel's format_currency slow, so it happens once per currency and locale.
+    pattern = parse_pattern(Locale.parse(locale).currency_formats["standard"])
+    symbol = get_currency_symbol(currency, locale)
+    return {
+        "positive": (pattern.prefix[0].replace("¤", symbol), pattern.suffix[0].replace("¤", symbol)),
+        "negative": (pattern.prefix[1].replace("¤", symbol), pattern.suffix[1].replace("¤", symbol)),
+        "precision": pattern.frac_prec[1],
+    }
+
+
+def _format_column(values, spec, locale):
+    # The whole column is formatted into one string, translated in a single
+    # call and split again.
+    if not values:
+        return []
+    text = "\n".join(format(value, spec) for value in values)
+    return text.translate(_separators(locale)).split("\n")
+
+
+def _decimal_values(values, precision):
+    # babel rounds the shortest decimal form of each float half to even
+    # (2.675 -> 2.68, 12.345 -> 12.34), while formatting a float rounds its
+    # binary value (2.675 -> 2.67). Values with no more than precision
+    # decimals come out the same either way, so only the others are turned
+    # into Decimals.
+    exact = np.round(values, precision) == values
+    return [value if is_exact else decimal.Decimal(repr(value)) for value, is_exact in zip(values.tolist(), exact.tolist())]
+
+
+def format_currency_values(values, currency=CURRENCY, locale=LOCALE):
+    # Same output as babel's format_currency with the standard pattern, e.g.
+    # "R$ 1.234,56", for a whole column at once. Missing values become
+    # MISSING_VALUE.
+    pattern = currency_pattern(currency, locale)
+    values = np.asarray(values, dtype=np.float64)
+    formatted = np.full(values.shape, MISSING_VALUE, dtype=object)
+    finite = np.isfinite(values)
+    numbers = _format_column(_decimal_values(np.abs(values[finite]), pattern["precision"]), f",.{pattern['precision']}f", locale)
+    signs = [pattern["negative"] if is_negative else pattern["positive"] for is_negative in (values[finite] < 0).tolist()]
+    formatted[finite] = [f"{prefix}{number}{suffix}" for number, (prefix, suffix) in zip(numbers, signs)]
+    return formatted
+
+
+def format_currency(value, currency=CURRENCY, locale=LOCALE):
+    return format_currency_values([value], currency, locale)[0]
+
+
+def format_count_values(values, locale=LOCALE):
+    # Averages passed in are rounded to the nearest whole number.
+    values = np.asarray(values, dtype=np.float64)
+    formatted = np.full(values.shape, MISSING_VALUE, dtype=object)
+    finite = np.isfinite(values)
+    formatted[finite] = _format_column(np.rint(values[finite]).astype(np.int64).tolist(), ",", locale)
+    return formatted
+
+
+def format_count(value, locale=LOCALE):
+    return format_count_values([value], locale)[0]
+
+
+def format_decimal_values(values, precision=2, locale=LOCALE):
+    values = np.asarray(values, dtype=np.float64)
+    formatted = np.full(values.shape, MISSING_VALUE, dtype=object)
+    finite = np.isfinite(values)
+    formatted[finite] = _format_column(_decimal_values(values[finite], precision), f",.{precision}f", locale)
+    return formatted
+
+
+def format_decimal(value, precision=2, locale=LOCALE):
+    return format_decimal_values([value], precision, locale)[0]
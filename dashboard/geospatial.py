@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_loader import dataset_version, main_data_path, order_date_range
+from parallel import submit_build
+
+GEOSPATIAL_COLUMNS = ["customer_id", "customer_city", "customer_geolocation_lat", "customer_geolocation_lng", "order_purchase_timestamp"]
+
+# Each level of detail bins customers into square cells of cell_size degrees
+# and zooms the map by projection_scale, so finer cells are only drawn when
+# the map is zoomed in far enough to tell them apart.
+GEO_LEVELS = {
+    "Country": {"cell_size": 1.0, "projection_scale": 1},
+    "Region": {"cell_size": 0.25, "projection_scale": 2.5},
+    "City": {"cell_size": 0.05, "projection_scale": 6},
+}
+GEO_CENTER = {"lat": -14.2, "lon": -51.9}
+MAX_GEO_POINTS = 5000
+
+
+class CustomerCells:
+    # Customer counts and coordinate sums per (day, cell), sorted by day, so
+    # the map for any date range sums one contiguous slice. Cells and their
+    # city labels are fixed over the whole history.
+    def __init__(self, days, day_offsets, cell_codes, points, customers, lat_sums, lng_sums, cities):
+        self.days = days
+        self.day_offsets = day_offsets
+        self.cell_codes = cell_codes
+        self.points = points
+        self.customers = customers
+        self.lat_sums = lat_sums
+        self.lng_sums = lng_sums
+        self.cities = cities
+
+    def between(self, start_date, end_date):
+        lo, hi = order_date_range(self.days, start_date, end_date)
+        window = slice(self.day_offsets[lo], self.day_offsets[hi])
+        cell_codes = self.cell_codes[window]
+        n_cells = len(self.cities)
+
+        points = np.bincount(cell_codes, weights=self.points[window], minlength=n_cells)
+        seen = points > 0
+        return pd.DataFrame({
+            "customer_geolocation_lat": np.bincount(cell_codes, weights=self.lat_sums[window], minlength=n_cells)[seen] / points[seen],
+            "customer_geolocation_lng": np.bincount(cell_codes, weights=self.lng_sums[window], minlength=n_cells)[seen] / points[seen],
+            "customer_city": self.cities[seen],
+            "customer_count": np.bincount(cell_codes, weights=self.customers[window], minlength=n_cells)[seen].astype(np.int64),
+        })
+
+
+def bin_customer_locations(main_df, cell_size, max_points=MAX_GEO_POINTS):
+    lat = main_df["customer_geolocation_lat"].to_numpy(dtype=np.float64, na_value=np.nan)
+    lng = main_df["customer_geolocation_lng"].to_numpy(dtype=np.float64, na_value=np.nan)
+    order_date = main_df["order_purchase_timestamp"].dt.normalize().to_numpy()
+    valid = ~(np.isnan(lat) | np.isnan(lng) | np.isnat(order_date))
+    lat, lng = lat[valid], lng[valid]
+
+    # Cells are grown until the map stays within max_points markers. The cell
+    # count falls roughly with the square of the cell size, so each step aims
+    # straight for the limit instead of doubling past it.
+    while True:
+        n_cols = int(np.ceil(360 / cell_size)) + 1
+        cell = np.floor((lat + 90) / cell_size).astype(np.int64) * n_cols + np.floor((lng + 180) / cell_size).astype(np.int64)
+        cells, cell_codes = np.unique(cell, return_inverse=True)
+        if len(cells) <= max_points:
+            break
+        cell_size *= max(np.sqrt(len(cells) / max_points), 1.05)
+
+    # Markers sit on the centroid of their customers and are labelled with the
+    # cell's most common city.
+    city_codes, cities = pd.factorize(main_df["customer_city"][valid])
+    n_cities = max(len(cities), 1)
+    seen = city_codes >= 0
+    city_pairs, city_counts = np.unique(cell_codes[seen].astype(np.int64) * n_cities + city_codes[seen], return_counts=True)
+    order = np.lexsort((-city_counts, city_pairs // n_cities))
+    top_pairs = city_pairs[order]
+    first = np.r_[True, top_pairs[1:] // n_cities != top_pairs[:-1] // n_cities]
+    top_city = np.full(len(cells), None, dtype=object)
+    top_city[top_pairs[first] // n_cities] = np.asarray(cities, dtype=object)[top_pairs[first] % n_cities]
+
+    n_cells = len(cells)
+    days, day_codes = np.unique(order_date[valid], return_inverse=True)
+    day_cells, pair_codes, points = np.unique(day_codes.astype(np.int64) * n_cells + cell_codes, return_inverse=True, return_counts=True)
+    return CustomerCells(
+        days,
+        np.searchsorted(day_cells // n_cells, np.arange(len(days) + 1)),
+        day_cells % n_cells,
+        points,
+        np.bincount(pair_codes, weights=main_df["customer_id"].notna().to_numpy()[valid]),
+        np.bincount(pair_codes, weights=lat),
+        np.bincount(pair_codes, weights=lng),
+        top_city,
+    )
+
+
+def build_customer_cells(main_df):
+    return {level: bin_customer_locations(main_df, detail["cell_size"]) for level, detail in GEO_LEVELS.items()}
+
+
+def prefetch_customer_cells(path=None):
+    path = path or main_data_path()
+    return submit_build(build_customer_cells, path, dataset_version(path), GEOSPATIAL_COLUMNS)
+
+
+def load_customer_cells(path=None):
+    with st.spinner("Binning customer locations..."):
+        return prefetch_customer_cells(path).result()
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_loader import ChunkMerger, dataset_version, main_data_path, order_date_range
+from parallel import submit_build
+from sketches import distinct_group_codes, estimate_cardinality, hll_registers, merge_registers
+
+OVERVIEW_COLUMNS = ["order_purchase_timestamp", "customer_unique_id", "product_category_name", "order_id", "seller_id", "customer_city", "payment_type", "payment_value", "review_score"]
+
+DISTINCT_METRICS = {
+    "total_customer": "customer_unique_id",
+    "total_product": "product_category_name",
+    "total_seller": "seller_id",
+    "total_payment_method": "payment_type",
+    "total_city": "customer_city",
+}
+
+# Distinct counts that can also be answered from per-day HyperLogLog sketches.
+APPROXIMATE_METRICS = ["total_customer", "total_product", "total_seller", "total_city"]
+
+
+class OverviewIndex:
+    # Per-day partial aggregates of the overview metrics. Additive metrics are
+    # kept as prefix sums so any date range costs two lookups; distinct counts
+    # keep the set of value codes seen on each day, stored day by day in one
+    # array, so a range only touches the codes of the days it covers. The
+    # approximate mode merges one HyperLogLog sketch per day instead, which
+    # costs the same for any range regardless of how many orders it holds.
+    # distinct_values maps the codes back to values so that indexes built
+    # over separate chunks of the data can be merged.
+    def __init__(self, days, prefix_totals, daily_max, daily_min, distinct_codes, distinct_values, daily_sketches):
+        self.days = days
+        self.prefix_totals = prefix_totals
+        self.daily_max = daily_max
+        self.daily_min = daily_min
+        self.distinct_codes = distinct_codes
+        self.distinct_values = distinct_values
+        self.daily_sketches = daily_sketches
+
+    def metrics(self, start_date, end_date, approximate=False):
+        lo, hi = order_date_range(self.days, start_date, end_date)
+        metrics = {name: prefix[hi] - prefix[lo] for name, prefix in self.prefix_totals.items()}
+
+        for name, (day_offsets, codes) in self.distinct_codes.items():
+            if approximate and name in self.daily_sketches:
+                registers = self.daily_sketches[name][lo:hi].max(axis=0, initial=0)
+                metrics[name] = int(np.rint(estimate_cardinality(registers)[0]))
+                continue
+
+            range_codes = codes[day_offsets[lo]:day_offsets[hi]]
+            metrics[name] = np.count_nonzero(np.bincount(range_codes)) if len(range_codes) else 0
+
+        payment_count = metrics.pop("payment_count")
+        has_payment = payment_count > 0
+        metrics["average_income"] = metrics["total_income"] / payment_count if has_payment else np.nan
+        metrics["max_income"] = np.nanmax(self.daily_max[lo:hi]) if has_payment else np.nan
+        metrics["min_income"] = np.nanmin(self.daily_min[lo:hi]) if has_payment else np.nan
+        return metrics
+
+
+def _prefix_sum(values):
+    return np.concatenate([[0], np.cumsum(values)])
+
+
+def build_overview_index(main_df):
+    order_date = main_df["order_purchase_timestamp"].dt.normalize()
+    valid = order_date.notna().to_numpy()
+    days, day_codes = np.unique(order_date[valid].to_numpy(), return_inverse=True)
+    n_days = len(days)
+
+    payment_value = main_df["payment_value"].to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+    review_score = main_df["review_score"].to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+    has_order = main_df["order_id"].notna().to_numpy()[valid]
+    has_payment = ~np.isnan(payment_value)
+
+    daily_totals = {
+        "total_order": np.bincount(day_codes[has_order], minlength=n_days),
+        "total_income": np.bincount(day_codes[has_payment], weights=payment_value[has_payment], minlength=n_days),
+        "payment_count": np.bincount(day_codes[has_payment], minlength=n_days),
+        "total_good_revies": np.bincount(day_codes[(review_score == 4) | (review_score == 5)], minlength=n_days),
+        "total_bad_revies": np.bincount(day_codes[(review_score == 1) | (review_score == 2)], minlength=n_days),
+    }
+    prefix_totals = {name: _prefix_sum(values) for name, values in daily_totals.items()}
+
+    daily_payment = pd.Series(payment_value).groupby(day_codes)
+    daily_max = daily_payment.max().reindex(range(n_days)).to_numpy()
+    daily_min = daily_payment.min().reindex(range(n_days)).to_numpy()
+
+    distinct_codes = {}
+    distinct_values = {}
+    for name, column in DISTINCT_METRICS.items():
+        codes, uniques = pd.factorize(main_df[column][valid])
+        distinct_codes[name] = distinct_group_codes(day_codes, codes, n_days, len(uniques))
+        distinct_values[name] = np.asarray(uniques, dtype=object)
+
+    daily_sketches = {
+        name: hll_registers(main_df[DISTINCT_METRICS[name]][valid], day_codes, n_days)
+        for name in APPROXIMATE_METRICS
+    }
+
+    return OverviewIndex(days, prefix_totals, daily_max, daily_min, distinct_codes, distinct_values, daily_sketches)
+
+
+def merge_overview_indexes(indexes):
+    # Combines indexes built over disjoint sets of rows into the index of all
+    # of them: per-day totals add up, extremes take the max/min, distinct
+    # value sets are re-coded against the union of their values and sketches
+    # merge register by register.
+    days = np.unique(np.concatenate([index.days for index in indexes]))
+    n_days = len(days)
+    positions = [np.searchsorted(days, index.days) for index in indexes]
+
+    prefix_totals = {}
+    for name in indexes[0].prefix_totals:
+        daily = np.zeros(n_days, dtype=np.result_type(*[index.prefix_totals[name] for index in indexes]))
+        for index, position in zip(indexes, positions):
+            np.add.at(daily, position, np.diff(index.prefix_totals[name]))
+        prefix_totals[name] = _prefix_sum(daily)
+
+    daily_max = np.full(n_days, np.nan)
+    daily_min = np.full(n_days, np.nan)
+    for index, position in zip(indexes, positions):
+        np.fmax.at(daily_max, position, index.daily_max)
+        np.fmin.at(daily_min, position, index.daily_min)
+
+    distinct_codes = {}
+    distinct_values = {}
+    for name in indexes[0].distinct_codes:
+        global_codes, values = pd.factorize(np.concatenate([index.distinct_values[name] for index in indexes]))
+        offsets = np.cumsum([0] + [len(index.distinct_values[name]) for index in indexes])
+        day_codes, codes = [], []
+        for index, position, offset in zip(indexes, positions, offsets):
+            day_offsets, index_codes = index.distinct_codes[name]
+            day_codes.append(np.repeat(position, np.diff(day_offsets)))
+            codes.append(global_codes[offset + index_codes])
+        distinct_codes[name] = distinct_group_codes(np.concatenate(day_codes), np.concatenate(codes), n_days, len(values))
+        distinct_values[name] = np.asarray(values, dtype=object)
+
+    daily_sketches = {
+        name: merge_registers(
+            np.concatenate([index.daily_sketches[name] for index in indexes]),
+            np.concatenate(positions),
+            n_days,
+        )
+        for name in indexes[0].daily_sketches
+    }
+
+    return OverviewIndex(days, prefix_totals, daily_max, daily_min, distinct_codes, distinct_values, daily_sketches)
+
+
+def build_overview_index_chunked(chunks):
+    merger = ChunkMerger(merge_overview_indexes)
+    for chunk in chunks:
+        merger.add(build_overview_index(chunk))
+    return merger.result()
+
+
+def prefetch_overview_index(path=None):
+    path = path or main_data_path()
+    return submit_build(build_overview_index, path, dataset_version(path), OVERVIEW_COLUMNS, build_overview_index_chunked)
+
+
+def load_overview_index(path=None):
+    with st.spinner("Indexing order dates..."):
+        return prefetch_overview_index(path).result()
@@ -0,0 +1,106 @@
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+
+from config import EXECUTION_MODE
+from data_loader import iter_main_data, read_main_data
+from snapshot import load_snapshot, save_snapshot, snapshot_path
+
+# The derived structures (overview index, order cube, customer cells) are
+# independent CPU-bound builds, so they run side by side in worker processes.
+# With a single core each is built when it is first needed instead.
+PARALLEL_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class DeferredBuild:
+    # Stands in for a future when there is no pool: the build runs on the
+    # first result() call, and only once.
+    def __init__(self, build):
+        self.build = build
+        self.value = None
+        self.done = False
+        self.lock = threading.Lock()
+
+    def result(self):
+        with self.lock:
+            if not self.done:
+                self.value = self.build()
+                self.done = True
+        return self.value
+
+
+class PooledBuild:
+    # The future of a build running in the worker pool. A worker that dies
+    # (killed for memory, say) breaks the whole pool, so the pool is dropped
+    # for the next build to start a fresh one, and this build runs in the
+    # calling process instead. A build that raised is dropped from the cache,
+    # so the next rerun starts it again rather than raising the same error.
+    def __init__(self, future, build, forget):
+        self.future = future
+        self.fallback = DeferredBuild(build)
+        self.forget = forget
+
+    def result(self):
+        try:
+            return self.future.result()
+        except BrokenProcessPool:
+            _executor.clear()
+            return self.fallback.result()
+        except Exception:
+            self.forget()
+            raise
+
+
+def build_from_main_data(builder, path, columns, chunked_builder=None, snapshot=None):
+    # Each worker reads the columns its builder needs straight from the
+    # dataset on disk (memory mapped Arrow buffers for the Parquet dataset),
+    # so the main frame is never pickled between processes; only the built
+    # aggregates travel back. In the chunked execution mode the columns are
+    # streamed into chunked_builder instead of being read at once.
+    if chunked_builder is not None and EXECUTION_MODE == "chunked":
+        value = chunked_builder(iter_main_data(path, columns=columns))
+    else:
+        value = builder(read_main_data(path, columns=columns))
+
+    if snapshot is not None:
+        try:
+            save_snapshot(snapshot, value)
+        except OSError:
+            # A read-only or full disk only costs the next launch a rebuild.
+            pass
+    return value
+
+
+@st.cache_resource(show_spinner=False)
+def _executor(workers):
+    # Spawned rather than forked: the Streamlit server is multi-threaded.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _submit_build(_builder, _chunked_builder, name, path, version, columns):
+    # A snapshot of the same build for this dataset version skips the build:
+    # mapping it takes milliseconds, even on a freshly started container.
+    snapshot = snapshot_path(name, version, columns)
+    if snapshot is not None and os.path.exists(snapshot):
+        return DeferredBuild(lambda: load_snapshot(snapshot))
+    build = functools.partial(build_from_main_data, _builder, path, list(columns), _chunked_builder, snapshot)
+    if PARALLEL_WORKERS <= 1:
+        return DeferredBuild(build)
+    try:
+        future = _executor(PARALLEL_WORKERS).submit(build)
+    except BrokenProcessPool:
+        _executor.clear()
+        return DeferredBuild(build)
+    return PooledBuild(future, build, functools.partial(_submit_build.clear, _builder, _chunked_builder, name, path, version, columns))
+
+
+def submit_build(builder, path, version, columns, chunked_builder=None):
+    # Starts the build in the background and returns its future; one build
+    # per builder and dataset version is shared by every session.
+    return _submit_build(builder, chunked_builder, f"{builder.__module__}.{builder.__name__}", path, version, tuple(columns))
@@ -0,0 +1,96 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+TRACE_FILE_NAME = "dashboard_trace.json"
+
+
+class RenderTrace:
+    # Records one script run as nested timed events: sections of the page,
+    # and the stages inside them (data loads, chart builds, st.plotly_chart
+    # calls). Events are kept in the Chrome trace event format so the export
+    # opens as a timeline in chrome://tracing or Perfetto.
+    def __init__(self, measure_payload=False):
+        self.measure_payload = measure_payload
+        self.events = []
+        self.started = time.perf_counter()
+        self._stack = []
+
+    @contextmanager
+    def _event(self, name, category, rows=None):
+        args = {}
+        if rows is not None:
+            args["rows"] = int(rows)
+        self._stack.append(name)
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            ended = time.perf_counter()
+            self._stack.pop()
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (started - self.started) * 1e6,
+                "dur": (ended - started) * 1e6,
+                "pid": os.getpid(),
+                "tid": 0,
+                "args": {"section": self._stack[0] if self._stack else name, **args},
+            })
+
+    def section(self, name, rows=None):
+        return self._event(name, "section", rows)
+
+    def stage(self, name, rows=None):
+        return self._event(name, "stage", rows)
+
+    def plotly_chart(self, visualize, *args, rows=None):
+        # Building the figure and handing it to Streamlit are timed apart:
+        # st.plotly_chart is where the figure gets serialized to JSON.
+        if rows is None and isinstance(args[0], pd.DataFrame):
+            rows = len(args[0])
+
+        name = visualize.__name__
+        with self._event(name, "chart", rows) as event:
+            with self.stage(f"{name}:build"):
+                fig = visualize(*args)
+            if self.measure_payload:
+                with self.stage(f"{name}:to_json"):
+                    event["payload_bytes"] = len(fig.to_json())
+            with self.stage(f"{name}:st.plotly_chart"):
+                st.plotly_chart(fig, use_container_width=True)
+        return fig
+
+    def summary(self):
+        events_df = pd.DataFrame([{"name": event["name"], "category": event["cat"], "seconds": event["dur"] / 1e6, **event["args"]} for event in self.events])
+        for column in ["rows", "payload_bytes"]:
+            if column not in events_df.columns:
+                events_df[column] = pd.NA
+
+        is_section = events_df["category"] == "section"
+        stages_df = events_df[~is_section].groupby("section", sort=False).agg(
+            charts=("category", lambda category: (category == "chart").sum()),
+            rows=("rows", "sum"),
+            payload_bytes=("payload_bytes", "sum"),
+        )
+        sections_df = events_df[is_section].set_index("name")[["seconds"]].join(stages_df)
+        return sections_df.rename_axis("section").reset_index(), events_df[~is_section]
+
+    def to_json(self):
+        return json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"})
+
+
+def render_trace_panel(trace):
+    sections_df, events_df = trace.summary()
+    with st.sidebar:
+        st.subheader("Profiling")
+        st.caption(f"Script run: {(time.perf_counter() - trace.started):.2f} s")
+        st.dataframe(sections_df, hide_index=True, use_container_width=True)
+        with st.expander("Stages"):
+            st.dataframe(events_df, hide_index=True, use_container_width=True)
+        st.download_button(label="Download Trace", data=trace.to_json(), file_name=TRACE_FILE_NAME, mime="application/json")
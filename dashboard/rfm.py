@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import EXECUTION_MODE
+from data_loader import IdDictionary, dataset_version, encode_ids, filter_by_order_date, iter_main_data, load_main_data, main_data_path
+from parallel import submit_build
+
+RFM_CATEGORIES = ["Top Customer", "High Value Customer", "Medium Value Customer", "Low Value Customer", "Bottom"]
+RFM_CACHE_SIZE = 16
+RFM_COLUMNS = ["customer_id", "order_purchase_timestamp", "payment_value"]
+
+
+def customer_rfm_partials(main_df):
+    # One grouped pass over the order lines: last purchase, spend and order
+    # line count per customer. CustomerRFMPartials adds up the partials of
+    # successive chunks.
+    customer_id = main_df["customer_id"]
+    is_encoded = isinstance(customer_id.dtype, pd.CategoricalDtype)
+    if is_encoded:
+        # Group on the integer codes of dictionary encoded IDs; a categorical
+        # group key would re-validate every category of the column.
+        customer_id = customer_id.cat.codes.rename("customer_id")
+
+    rfm_df = main_df.groupby(customer_id, sort=False).agg(
+        last_purchase=("order_purchase_timestamp", "max"),
+        monetary=("payment_value", "sum"),
+        frequency=("order_purchase_timestamp", "count"),
+    ).reset_index()
+    if is_encoded:
+        rfm_df["customer_id"] = pd.Categorical.from_codes(rfm_df["customer_id"], dtype=main_df["customer_id"].dtype)
+    return rfm_df
+
+
+class CustomerRFMPartials:
+    # The RFM partials of a stream of chunks, kept in arrays indexed by one
+    # running customer dictionary: adding a chunk looks up and updates only
+    # that chunk's customers, however many were seen before.
+    def __init__(self):
+        self.customer_ids = IdDictionary()
+        self.last_purchase = np.array([], dtype="datetime64[ns]")
+        self.monetary = np.array([], dtype=np.float64)
+        self.frequency = np.array([], dtype=np.int64)
+
+    def add(self, main_df):
+        # Date filtered chunks are often empty.
+        if not len(main_df):
+            return
+        chunk_df = customer_rfm_partials(main_df)
+        codes = self.customer_ids.encode(chunk_df["customer_id"])
+        known = codes >= 0
+        codes = codes[known]
+
+        if len(self.customer_ids) > len(self.monetary):
+            # Grown by doubling, so copying stays linear in the customers seen.
+            grow = max(len(self.customer_ids), 2 * len(self.monetary)) - len(self.monetary)
+            self.last_purchase = np.concatenate([self.last_purchase, np.full(grow, np.datetime64("NaT", "ns"))])
+            self.monetary = np.concatenate([self.monetary, np.zeros(grow)])
+            self.frequency = np.concatenate([self.frequency, np.zeros(grow, dtype=np.int64)])
+
+        # A customer appears once per chunk's partials, so plain fancy
+        # indexing updates every one of them.
+        self.last_purchase[codes] = np.fmax(self.last_purchase[codes], chunk_df["last_purchase"].to_numpy(dtype="datetime64[ns]")[known])
+        self.monetary[codes] += chunk_df["monetary"].to_numpy()[known]
+        self.frequency[codes] += chunk_df["frequency"].to_numpy()[known]
+
+    def to_frame(self):
+        n_customers = len(self.customer_ids)
+        return pd.DataFrame({
+            "customer_id": pd.Categorical.from_codes(np.arange(n_customers), categories=self.customer_ids.categories()),
+            "last_purchase": self.last_purchase[:n_customers],
+            "monetary": self.monetary[:n_customers],
+            "frequency": self.frequency[:n_customers],
+        })
+
+
+def _finish_customer_rfm_metrics(rfm_df, latest_order_timestamp):
+    # Recency is measured in whole days from the customer's last purchase to
+    # the latest purchase in the data. max() of an empty range is NaT, which
+    # has no normalize(). Spend is rounded to whole centavos so that sums
+    # taken in a different order (chunk by chunk) rank customers the same.
+    latest_order_date = pd.Timestamp(latest_order_timestamp).floor("D")
+    rfm_df.insert(1, "recency", (latest_order_date - rfm_df.pop("last_purchase").dt.normalize()).dt.days)
+    rfm_df["monetary"] = rfm_df["monetary"].round(2)
+    return rfm_df
+
+
+def create_customer_rfm_metrics(main_df):
+    return _finish_customer_rfm_metrics(customer_rfm_partials(main_df), main_df["order_purchase_timestamp"].max())
+
+
+def score_rfm_df(rfm_df):
+    rfm_df["r_rank"] = rfm_df["recency"].rank(ascending=False)
+    rfm_df["f_rank"] = rfm_df["frequency"].rank(ascending=True)
+    rfm_df["m_rank"] = rfm_df["monetary"].rank(ascending=True)
+
+    rfm_df["r_rank_norm"] = (rfm_df["r_rank"] / rfm_df["r_rank"].max()) * 100
+    rfm_df["f_rank_norm"] = (rfm_df["f_rank"] / rfm_df["f_rank"].max()) * 100
+    rfm_df["m_rank_norm"] = (rfm_df["m_rank"] / rfm_df["m_rank"].max()) * 100
+
+    rfm_df["r_score"] = rfm_df["r_rank_norm"] * 0.05
+    rfm_df["f_score"] = rfm_df["f_rank_norm"] * 0.05
+    rfm_df["m_score"] = rfm_df["m_rank_norm"] * 0.05
+
+    rfm_df["rfm_score"] = rfm_df["r_score"] * 0.2 + rfm_df["f_score"] * 0.3 + rfm_df["m_score"] * 0.5
+
+    rfm_score = rfm_df["rfm_score"].to_numpy()
+    rfm_df["category"] = np.select(
+        [rfm_score > 4.0, rfm_score > 3.0, rfm_score > 2.0, rfm_score > 1.0],
+        RFM_CATEGORIES[:-1],
+        default=RFM_CATEGORIES[-1],
+    )
+
+    return rfm_df
+
+
+def create_rfm_df(main_df):
+    return score_rfm_df(create_customer_rfm_metrics(main_df))
+
+
+def create_rfm_df_chunked(chunks):
+    partials = CustomerRFMPartials()
+    for chunk in chunks:
+        partials.add(chunk)
+    return score_rfm_partials(partials.to_frame())
+
+
+def score_rfm_partials(partials):
+    rfm_df = _finish_customer_rfm_metrics(encode_ids(partials, ["customer_id"]), partials["last_purchase"].max())
+    return score_rfm_df(rfm_df)
+
+
+@st.cache_resource(max_entries=RFM_CACHE_SIZE, show_spinner=False)
+def get_rfm_df(_main_df, version, start_date, end_date):
+    # Keyed on the dataset version and the selected range only; the frame
+    # itself is not hashed. Once RFM_CACHE_SIZE ranges are cached the least
+    # recently used one is evicted. The returned frame is shared between
+    # reruns and must not be modified.
+    return create_rfm_df(filter_by_order_date(_main_df, start_date, end_date))
+
+
+def prefetch_rfm_df(path=None):
+    # RFM over the whole history, built in a worker process.
+    path = path or main_data_path()
+    return submit_build(create_rfm_df, path, dataset_version(path), RFM_COLUMNS, create_rfm_df_chunked)
+
+
+@st.cache_resource(max_entries=RFM_CACHE_SIZE, show_spinner="Streaming orders...")
+def _get_rfm_df_chunked(path, version, start_date, end_date):
+    # Only the order_year partitions overlapping the range are read.
+    years = range(pd.Timestamp(start_date).year, pd.Timestamp(end_date).year + 1)
+    chunks = iter_main_data(path, columns=RFM_COLUMNS, years=years)
+    return create_rfm_df_chunked(filter_by_order_date(chunk, start_date, end_date) for chunk in chunks)
+
+
+def load_rfm_df(start_date, end_date, path=None, full_range=False):
+    # The whole history is the prefetched (or snapshotted) RFM build.
+    if full_range:
+        return prefetch_rfm_df(path).result()
+
+    path = path or main_data_path()
+    version = dataset_version(path)
+    if EXECUTION_MODE == "chunked":
+        return _get_rfm_df_chunked(path, version, start_date, end_date)
+
+    main_df, _ = load_main_data(columns=RFM_COLUMNS, path=path)
+    return get_rfm_df(main_df, version, start_date, end_date)
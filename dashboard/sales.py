@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_loader import ChunkMerger, dataset_version, encode_ids, file_version, main_data_path, order_date_range
+from etl import RAW_DATA_DIR, raw_table_path
+from parallel import submit_build
+
+# Product rankings can be weighted by units sold (order lines) or by revenue.
+PRODUCT_MEASURES = ["customer_count", "revenue"]
+CATEGORY_PRODUCT_COLUMNS = ["order_purchase_timestamp", "product_category_name", "product_id", "customer_id", "payment_value"]
+PRODUCT_DETAIL_COLUMNS = ["product_id", "product_photos_qty", "product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm"]
+
+
+def top_k(values, k, largest=True):
+    # Positions of the k largest (or smallest) values in ranking order.
+    # argpartition picks them in linear time and only those k get sorted;
+    # ties keep their original order.
+    keys = -values if largest else values
+    if k < len(keys):
+        positions = np.argpartition(keys, k - 1)[:k]
+    else:
+        positions = np.arange(len(keys))
+    return positions[np.lexsort((positions, keys[positions]))]
+
+
+class ProductSales:
+    # Units sold and revenue per category for one date range, summed once
+    # from the cube's per-day category rollup.
+    def __init__(self, categories, category_totals):
+        self.categories = categories
+        self.category_totals = category_totals
+
+    def top_categories(self, measure, k=10, largest=True):
+        positions = top_k(self.category_totals[measure], k, largest)
+        return pd.DataFrame({"product_category_name": self.categories[positions], measure: self.category_totals[measure][positions]})
+
+
+def build_product_sales(category_df):
+    # Orders without a category are left out of the rankings.
+    totals = category_df.groupby("product_category_name")[PRODUCT_MEASURES].sum()
+    category_totals = {measure: totals[measure].to_numpy() for measure in PRODUCT_MEASURES}
+    category_totals["revenue"] = category_totals["revenue"].round(2)
+    return ProductSales(totals.index, category_totals)
+
+
+class CategoryProducts:
+    # Units sold and revenue per category, day and product, sorted by
+    # category and then by day. A category's rows for a date range are one
+    # contiguous slice, so a drill-down only sums the rows of that slice.
+    # Categories and products are categorical so the rollup snapshots as
+    # plain arrays.
+    def __init__(self, rollup_df):
+        self.rollup_df = rollup_df
+        self.categories = rollup_df["product_category_name"].cat.categories
+        category_codes = rollup_df["product_category_name"].cat.codes.to_numpy()
+        self.category_offsets = np.searchsorted(category_codes, np.arange(len(self.categories) + 1))
+        self.order_dates = rollup_df["order_date"].to_numpy()
+
+    def products(self, category, start_date, end_date):
+        position = self.categories.get_indexer([category])[0]
+        lo, hi = (self.category_offsets[position], self.category_offsets[position + 1]) if position >= 0 else (0, 0)
+        day_lo, day_hi = order_date_range(self.order_dates[lo:hi], start_date, end_date)
+        range_df = self.rollup_df.iloc[lo + day_lo:lo + day_hi]
+
+        totals = range_df.groupby("product_id", observed=True)[PRODUCT_MEASURES].sum()
+        totals["revenue"] = totals["revenue"].round(2)
+        return totals.reset_index()
+
+
+def _category_products(grouped):
+    rollup_df = grouped[PRODUCT_MEASURES].sum().reset_index()
+    # Sorted categories keep the codes in the rollup's order.
+    rollup_df["product_category_name"] = rollup_df["product_category_name"].astype(pd.CategoricalDtype(sorted(rollup_df["product_category_name"].unique())))
+    return CategoryProducts(encode_ids(rollup_df, ["product_id"]))
+
+
+def build_category_products(main_df):
+    # Orders without a category are left out, as in the rankings.
+    category_df = main_df.assign(
+        order_date=main_df["order_purchase_timestamp"].dt.normalize(),
+        customer_count=main_df["customer_id"].notna().astype(np.int64),
+        revenue=main_df["payment_value"],
+    )
+    return _category_products(category_df.groupby(["product_category_name", "order_date", "product_id"], observed=True))
+
+
+def merge_category_products(category_products):
+    # Rollups of disjoint sets of rows add up cell by cell.
+    rollup_df = pd.concat([products.rollup_df.astype({"product_category_name": object, "product_id": object}) for products in category_products], ignore_index=True)
+    return _category_products(rollup_df.groupby(["product_category_name", "order_date", "product_id"]))
+
+
+def build_category_products_chunked(chunks):
+    merger = ChunkMerger(merge_category_products)
+    for chunk in chunks:
+        merger.add(build_category_products(chunk))
+    return merger.result()
+
+
+def prefetch_category_products(path=None):
+    path = path or main_data_path()
+    return submit_build(build_category_products, path, dataset_version(path), CATEGORY_PRODUCT_COLUMNS, build_category_products_chunked)
+
+
+def top_products(products_df, measure, k=10, largest=True):
+    positions = top_k(products_df[measure].to_numpy(), k, largest)
+    return products_df[["product_id", measure]].iloc[positions].astype({"product_id": str}).reset_index(drop=True)
+
+
+def load_category_products(category, start_date, end_date, path=None):
+    # Product level totals are only needed for the category being drilled
+    # into; the rollup they come from is built in a worker with the other
+    # derived data.
+    return prefetch_category_products(path).result().products(category, start_date, end_date)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_product_details(path, version):
+    return pd.read_csv(path, usecols=PRODUCT_DETAIL_COLUMNS).drop_duplicates("product_id").set_index("product_id")
+
+
+def product_details(products_df, path=None):
+    # Catalogue attributes from products_dataset.csv for the handful of
+    # products being displayed. Products missing from the catalogue keep
+    # empty attributes.
+    path = path or raw_table_path(RAW_DATA_DIR, "products")
+    details_df = _load_product_details(path, file_version(path))
+    return products_df.join(details_df, on="product_id")
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 12
+
+
+def hll_relative_error(precision=HLL_PRECISION):
+    return 1.04 / np.sqrt(1 << precision)
+
+
+def _bit_length(values):
+    # Split into 32-bit halves so the float conversion used by frexp is exact.
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def hll_registers(values, group_codes, n_groups, precision=HLL_PRECISION):
+    # Builds one HyperLogLog register row per group. Null values and rows
+    # with a negative group code are ignored, like nunique() does.
+    values = pd.Series(values).reset_index(drop=True)
+    group_codes = np.asarray(group_codes)
+    mask = values.notna().to_numpy() & (group_codes >= 0)
+    hashes = pd.util.hash_pandas_object(values[mask], index=False).to_numpy()
+
+    register_index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    remaining = hashes << np.uint64(precision)
+    rank = np.minimum(65 - _bit_length(remaining), 64 - precision + 1).astype(np.uint8)
+
+    m = 1 << precision
+    registers = np.zeros(n_groups * m, dtype=np.uint8)
+    np.maximum.at(registers, group_codes[mask].astype(np.int64) * m + register_index, rank)
+    return registers.reshape(n_groups, m)
+
+
+def merge_registers(registers, group_codes, n_groups):
+    # Union of sketches is the element-wise maximum of their registers.
+    merged = np.zeros((n_groups, registers.shape[1]), dtype=np.uint8)
+    group_codes = np.asarray(group_codes)
+    mask = group_codes >= 0
+    if not mask.any():
+        return merged
+
+    order = np.argsort(group_codes[mask], kind="stable")
+    sorted_codes = group_codes[mask][order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    merged[sorted_codes[starts]] = np.maximum.reduceat(registers[mask][order], starts, axis=0)
+    return merged
+
+
+def distinct_group_codes(group_codes, codes, n_groups, n_codes):
+    # The distinct (group, code) pairs, sorted by group, as the offsets of
+    # each group's codes and the codes themselves. Null values (code -1) and
+    # rows with a negative group code are ignored.
+    n_codes = max(n_codes, 1)
+    seen = (codes >= 0) & (group_codes >= 0)
+    pairs = np.unique(group_codes[seen].astype(np.int64) * n_codes + codes[seen])
+    group_offsets = np.searchsorted(pairs // n_codes, np.arange(n_groups + 1))
+    return group_offsets, pairs % n_codes
+
+
+def estimate_cardinality(registers):
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=1)
+
+    # Linear counting is more accurate while many registers are still empty.
+    zeros = (registers == 0).sum(axis=1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((estimate <= 2.5 * m) & (zeros > 0), linear, estimate)
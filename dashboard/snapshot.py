@@ -0,0 +1,108 @@
+import argparse
+import glob
+import hashlib
+import mmap
+import os
+import pickle
+
+import numpy as np
+
+from config import SNAPSHOT_DIR
+
+# Bumped whenever a derived structure changes shape, so snapshots written by
+# older code are never loaded.
+SNAPSHOT_FORMAT = 4
+SNAPSHOT_MAGIC = b"DASHSNAP"
+SNAPSHOT_ALIGNMENT = 64
+
+
+def snapshot_path(name, version, columns):
+    if not SNAPSHOT_DIR:
+        return None
+    key = hashlib.sha1(f"{SNAPSHOT_FORMAT}|{name}|{version}|{','.join(columns)}".encode()).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f"{name}-{key[:16]}.snapshot")
+
+
+def _aligned(offset):
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+
+def save_snapshot(path, value):
+    # Pickled with protocol 5: the pickle stream only holds the object
+    # structure, and every contiguous NumPy buffer (rollup columns, sketch
+    # registers, prefix sums) is written raw after it, aligned so it can be
+    # mapped back as an array without copying.
+    buffers = []
+    structure = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+    lengths = np.array([len(structure)] + [raw.nbytes for raw in raw_buffers], dtype="<i8")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(np.int64(len(raw_buffers)).tobytes())
+        f.write(lengths.tobytes())
+        f.write(structure)
+        for raw in raw_buffers:
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(raw)
+    # Renamed into place, so a reader never sees a half written snapshot.
+    os.replace(temp_path, path)
+    remove_stale_snapshots(path)
+
+
+def remove_stale_snapshots(path):
+    # Snapshots of the same build under another key (an older dataset
+    # version, columns or format) are never loaded again. Sessions that
+    # still have one mapped keep reading it until they let go.
+    directory, file_name = os.path.split(path)
+    name = file_name.rsplit("-", 1)[0]
+    for stale_path in glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(name)}-*.snapshot")):
+        if stale_path != path:
+            try:
+                os.remove(stale_path)
+            except FileNotFoundError:
+                pass
+
+
+def load_snapshot(path):
+    # Arrays come back read-only, backed by the page cache: launching a
+    # container costs a mapping, and pages are read as they are touched.
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    if view[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a dashboard snapshot")
+
+    offset = len(SNAPSHOT_MAGIC)
+    n_buffers = int(np.frombuffer(view, dtype="<i8", count=1, offset=offset)[0])
+    offset += 8
+    lengths = np.frombuffer(view, dtype="<i8", count=n_buffers + 1, offset=offset)
+    offset += lengths.nbytes
+
+    structure = view[offset:offset + lengths[0]]
+    offset += int(lengths[0])
+    buffers = []
+    for length in lengths[1:]:
+        offset = _aligned(offset)
+        buffers.append(view[offset:offset + length])
+        offset += int(length)
+    return pickle.loads(structure, buffers=buffers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the warm-start snapshots for the current dataset, e.g. while building the container image.")
+    parser.add_argument("--path", help="Dataset to snapshot instead of the one the dashboard reads.")
+    args = parser.parse_args()
+
+    # Imported here: the builders import this module through parallel.py.
+    from cube import prefetch_order_cube
+    from geospatial import prefetch_customer_cells
+    from overview import prefetch_overview_index
+    from rfm import prefetch_rfm_df
+    from sales import prefetch_category_products
+
+    futures = [prefetch(args.path) for prefetch in [prefetch_overview_index, prefetch_order_cube, prefetch_customer_cells, prefetch_rfm_df, prefetch_category_products]]
+    for future in futures:
+        future.result()
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from analytics import customer_state_counts
+from data_loader import decode_ids
+from formatting import format_count_values, format_currency_values
+
+# Large enough to scroll through every notable customer, small enough that
+# the table stays cheap to send on each rerun.
+MONETARY_TABLE_ROWS = 5_000
+
+
+def customer_state_table(order_cube):
+    state_df = customer_state_counts(order_cube).sort_values("revenue", ascending=False)
+    return pd.DataFrame({
+        "State": state_df["customer_state"],
+        "Customers": format_count_values(state_df["customer_count"]),
+        "Revenue (BRL)": format_currency_values(state_df["revenue"]),
+    })
+
+
+def customer_monetary_table(rfm_df, rows=MONETARY_TABLE_ROWS):
+    monetary_df = decode_ids(rfm_df.nlargest(rows, "monetary"))
+    return pd.DataFrame({
+        "Customer ID": monetary_df["customer_id"].to_numpy(),
+        "Segment": monetary_df["category"].to_numpy(),
+        "Frequency (N Times)": format_count_values(monetary_df["frequency"]),
+        "Monetary (BRL)": format_currency_values(monetary_df["monetary"]),
+    })
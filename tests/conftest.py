@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The dashboard modules import each other as top-level modules, the way
+# `streamlit run dashboard/main.py` puts them on the path.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "dashboard"))
+
+from benchmark import generate_main_data  # noqa: E402
+from data_loader import PARTITION_COLUMN  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def main_data_parquet(tmp_path_factory):
+    # A small synthetic order history written like convert_main_data_to_parquet:
+    # sorted by purchase time and partitioned by order_year.
+    path = tmp_path_factory.mktemp("main_data") / "main_data.parquet"
+    generate_main_data(5_000, seed=1).to_parquet(path, engine="pyarrow", partition_cols=[PARTITION_COLUMN], index=False)
+    return str(path)
@@ -0,0 +1,28 @@
+import functools
+
+import pandas as pd
+
+import analytics
+from analytics import run_reports
+from data_loader import filter_by_order_date, iter_main_data, read_main_data
+
+PAYMENT_REPORTS = ["payment_type_usage", "payment_type_growth"]
+DATE_RANGES = [(pd.Timestamp("2016-09-01"), pd.Timestamp("2018-10-17")), (pd.Timestamp("2017-03-01"), pd.Timestamp("2017-09-30")), (pd.Timestamp("2015-01-01"), pd.Timestamp("2015-01-31"))]
+
+
+def test_payment_reports_count_customers_exactly(main_data_parquet, monkeypatch):
+    memory_reports = run_reports(DATE_RANGES, PAYMENT_REPORTS, main_data_parquet)
+    monkeypatch.setattr(analytics, "EXECUTION_MODE", "chunked")
+    monkeypatch.setattr(analytics, "iter_main_data", functools.partial(iter_main_data, chunk_rows=400))
+    chunked_reports = run_reports(DATE_RANGES, PAYMENT_REPORTS, main_data_parquet)
+
+    main_df = read_main_data(main_data_parquet, columns=["order_purchase_timestamp", "order_year", "payment_type", "customer_id"])
+    for start_date, end_date in DATE_RANGES:
+        range_df = filter_by_order_date(main_df, start_date, end_date)
+        expected_usage = range_df.groupby("payment_type", observed=True).customer_id.nunique().to_dict()
+        expected_growth = range_df.groupby(["order_year", "payment_type"], observed=True).customer_id.nunique().to_dict()
+        for reports in [memory_reports, chunked_reports]:
+            usage_df = reports["payment_type_usage"][lambda df: df["start_date"] == start_date]
+            assert dict(zip(usage_df["payment_type"].astype(str), usage_df["customer_count"])) == expected_usage
+            growth_df = reports["payment_type_growth"][lambda df: df["start_date"] == start_date]
+            assert dict(zip(zip(growth_df["order_year"], growth_df["payment_type"].astype(str)), growth_df["customer_count"])) == expected_growth
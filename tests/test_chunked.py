@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import CUBE_COLUMNS, CUBE_ROLLUPS, build_order_cube, build_order_cube_chunked
+from data_loader import filter_by_order_date, iter_main_data, read_main_data
+from overview import OVERVIEW_COLUMNS, build_overview_index, build_overview_index_chunked
+from rfm import RFM_COLUMNS, create_rfm_df, create_rfm_df_chunked
+from sales import CATEGORY_PRODUCT_COLUMNS, build_category_products, build_category_products_chunked
+
+CHUNK_ROWS = 400
+DATE_RANGES = [("2016-09-01", "2018-10-17"), ("2017-03-01", "2017-09-30"), ("2018-02-10", "2018-02-12")]
+
+
+@pytest.mark.parametrize("start_date, end_date", DATE_RANGES)
+def test_overview_metrics_match(main_data_parquet, start_date, end_date):
+    memory_index = build_overview_index(read_main_data(main_data_parquet, columns=OVERVIEW_COLUMNS))
+    chunked_index = build_overview_index_chunked(iter_main_data(main_data_parquet, columns=OVERVIEW_COLUMNS, chunk_rows=CHUNK_ROWS))
+
+    for approximate in [False, True]:
+        memory_metrics = memory_index.metrics(start_date, end_date, approximate=approximate)
+        chunked_metrics = chunked_index.metrics(start_date, end_date, approximate=approximate)
+        assert memory_metrics.keys() == chunked_metrics.keys()
+        for name, value in memory_metrics.items():
+            assert chunked_metrics[name] == pytest.approx(value, nan_ok=True), name
+
+
+@pytest.mark.parametrize("start_date, end_date", DATE_RANGES)
+def test_order_cube_matches(main_data_parquet, start_date, end_date):
+    memory_cube = build_order_cube(read_main_data(main_data_parquet, columns=CUBE_COLUMNS)).between(start_date, end_date)
+    chunked_cube = build_order_cube_chunked(iter_main_data(main_data_parquet, columns=CUBE_COLUMNS, chunk_rows=CHUNK_ROWS)).between(start_date, end_date)
+
+    for name, rollup in CUBE_ROLLUPS.items():
+        keys = ["order_date"] + rollup["dimensions"]
+        memory_df = memory_cube.rollup(name).astype({key: str for key in keys[1:]}).sort_values(keys, ignore_index=True)
+        chunked_df = chunked_cube.rollup(name).astype({key: str for key in keys[1:]}).sort_values(keys, ignore_index=True)
+        pd.testing.assert_frame_equal(memory_df, chunked_df, check_dtype=False, check_exact=False)
+
+    for approximate in [False, True]:
+        assert memory_cube.distinct_count("payment_type", ["payment_type"], approximate=approximate).astype({"payment_type": str}).equals(
+            chunked_cube.distinct_count("payment_type", ["payment_type"], approximate=approximate).astype({"payment_type": str}))
+
+
+@pytest.mark.parametrize("start_date, end_date", DATE_RANGES)
+def test_rfm_matches(main_data_parquet, start_date, end_date):
+    main_df = read_main_data(main_data_parquet, columns=RFM_COLUMNS)
+    memory_rfm = create_rfm_df(filter_by_order_date(main_df, start_date, end_date))
+    chunks = iter_main_data(main_data_parquet, columns=RFM_COLUMNS, chunk_rows=CHUNK_ROWS)
+    chunked_rfm = create_rfm_df_chunked(filter_by_order_date(chunk, start_date, end_date) for chunk in chunks)
+
+    columns = ["customer_id", "recency", "frequency", "monetary", "rfm_score", "category"]
+    memory_rfm = memory_rfm[columns].astype({"customer_id": str}).sort_values("customer_id", ignore_index=True)
+    chunked_rfm = chunked_rfm[columns].astype({"customer_id": str}).sort_values("customer_id", ignore_index=True)
+    assert len(chunked_rfm) == len(memory_rfm)
+    pd.testing.assert_frame_equal(memory_rfm, chunked_rfm, check_dtype=False)
+    assert np.isfinite(chunked_rfm["recency"]).all()
+
+
+@pytest.mark.parametrize("start_date, end_date", DATE_RANGES)
+def test_category_products_match(main_data_parquet, start_date, end_date):
+    main_df = read_main_data(main_data_parquet, columns=CATEGORY_PRODUCT_COLUMNS)
+    memory_products = build_category_products(main_df)
+    chunked_products = build_category_products_chunked(iter_main_data(main_data_parquet, columns=CATEGORY_PRODUCT_COLUMNS, chunk_rows=CHUNK_ROWS))
+
+    for category in list(memory_products.categories[:3]) + ["no_such_category"]:
+        range_df = filter_by_order_date(main_df, start_date, end_date)
+        range_df = range_df[range_df["product_category_name"].to_numpy() == category]
+        expected_df = range_df.groupby("product_id", observed=True).agg(customer_count=("customer_id", "count"), revenue=("payment_value", "sum"))
+        expected_df = expected_df.round({"revenue": 2}).reset_index().astype({"product_id": str}).sort_values("product_id", ignore_index=True)
+        for products in [memory_products, chunked_products]:
+            products_df = products.products(category, start_date, end_date).astype({"product_id": str}).sort_values("product_id", ignore_index=True)
+            pd.testing.assert_frame_equal(expected_df, products_df, check_dtype=False)
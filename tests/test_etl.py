@@ -0,0 +1,128 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import etl
+from etl import RAW_TABLES, build_main_data
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+DIMENSION_TABLES = ["products", "sellers", "category_translation"]
+BUCKETS = 4
+CHUNKSIZE = 50
+
+
+def _hex_ids(rng, n):
+    return np.array([f"{value:032x}" for value in rng.integers(0, 2**63, n)])
+
+
+def write_raw_tables(raw_dir, n_orders, seed=0):
+    # A small Olist order history. Of its last three orders, one was
+    # purchased in the same second as the order before them and one well
+    # before it, like orders that reach the raw tables late.
+    rng = np.random.default_rng(seed)
+    os.makedirs(raw_dir, exist_ok=True)
+    for table in DIMENSION_TABLES:
+        shutil.copy(os.path.join(DATA_DIR, RAW_TABLES[table]), raw_dir)
+    product_ids = pd.read_csv(os.path.join(DATA_DIR, RAW_TABLES["products"]), usecols=["product_id"])["product_id"].to_numpy()
+    seller_ids = pd.read_csv(os.path.join(DATA_DIR, RAW_TABLES["sellers"]), usecols=["seller_id"])["seller_id"].to_numpy()
+
+    order_ids, customer_ids = _hex_ids(rng, n_orders), _hex_ids(rng, n_orders)
+    seconds = np.sort(rng.integers(0, 200 * 86400, n_orders))
+    seconds[-3], seconds[-1] = seconds[-4], seconds[n_orders // 2]
+    timestamps = pd.Timestamp("2017-01-01") + pd.to_timedelta(seconds, unit="s")
+    zip_codes = np.array([f"{code:05d}" for code in range(1000, 1020)])
+
+    pd.DataFrame({
+        "order_id": order_ids,
+        "customer_id": customer_ids,
+        "order_status": rng.choice(["delivered", "shipped", "canceled"], n_orders),
+        "order_purchase_timestamp": timestamps.strftime("%Y-%m-%d %H:%M:%S"),
+    }).to_csv(os.path.join(raw_dir, RAW_TABLES["orders"]), index=False)
+    pd.DataFrame({
+        "customer_id": customer_ids,
+        "customer_unique_id": _hex_ids(rng, n_orders),
+        "customer_zip_code_prefix": rng.choice(zip_codes, n_orders),
+        "customer_city": rng.choice(["sao paulo", "campinas"], n_orders),
+        "customer_state": "SP",
+    }).to_csv(os.path.join(raw_dir, RAW_TABLES["customers"]), index=False)
+    items = rng.integers(1, 3, n_orders)
+    pd.DataFrame({
+        "order_id": np.repeat(order_ids, items),
+        "order_item_id": np.concatenate([np.arange(1, count + 1) for count in items]),
+        "product_id": rng.choice(product_ids, items.sum()),
+        "seller_id": rng.choice(seller_ids, items.sum()),
+        "price": rng.gamma(2, 50, items.sum()).round(2),
+        "freight_value": 10.0,
+    }).to_csv(os.path.join(raw_dir, RAW_TABLES["order_items"]), index=False)
+    pd.DataFrame({
+        "order_id": order_ids,
+        "payment_sequential": 1,
+        "payment_type": rng.choice(["credit_card", "boleto"], n_orders),
+        "payment_installments": rng.integers(1, 8, n_orders),
+        "payment_value": rng.gamma(2, 80, n_orders).round(2),
+    }).to_csv(os.path.join(raw_dir, RAW_TABLES["order_payments"]), index=False)
+    pd.DataFrame({
+        "review_id": _hex_ids(rng, n_orders),
+        "order_id": order_ids,
+        "review_score": rng.integers(1, 6, n_orders),
+    }).to_csv(os.path.join(raw_dir, RAW_TABLES["order_reviews"]), index=False)
+    pd.DataFrame({
+        "geolocation_zip_code_prefix": np.repeat(zip_codes, 2),
+        "geolocation_lat": rng.uniform(-30, -5, 2 * len(zip_codes)),
+        "geolocation_lng": rng.uniform(-60, -40, 2 * len(zip_codes)),
+    }).to_csv(os.path.join(raw_dir, RAW_TABLES["geolocation"]), index=False)
+
+
+def keep_orders(raw_dir, n_orders):
+    # The raw tables as they were before the last orders came in.
+    order_ids = pd.read_csv(os.path.join(raw_dir, RAW_TABLES["orders"]))["order_id"].iloc[:n_orders]
+    for table in ["orders", "order_items", "order_payments", "order_reviews"]:
+        path = os.path.join(raw_dir, RAW_TABLES[table])
+        df = pd.read_csv(path)
+        df[df["order_id"].isin(order_ids)].to_csv(path, index=False)
+
+
+def read_sorted(path):
+    df = pd.read_csv(path, dtype=str)
+    return df.sort_values(list(df.columns), ignore_index=True)
+
+
+@pytest.fixture
+def raw_dirs(tmp_path):
+    full_dir, partial_dir = tmp_path / "full", tmp_path / "partial"
+    write_raw_tables(full_dir, 120)
+    write_raw_tables(partial_dir, 120)
+    keep_orders(partial_dir, 117)
+    return full_dir, partial_dir
+
+
+def test_incremental_build_matches_full_build(tmp_path, raw_dirs):
+    full_dir, partial_dir = raw_dirs
+    build_main_data(full_dir, tmp_path / "full.csv", buckets=BUCKETS, chunksize=CHUNKSIZE)
+    build_main_data(partial_dir, tmp_path / "incremental.csv", buckets=BUCKETS, chunksize=CHUNKSIZE)
+
+    assert build_main_data(full_dir, tmp_path / "incremental.csv", incremental=True, buckets=BUCKETS, chunksize=CHUNKSIZE) > 0
+    pd.testing.assert_frame_equal(read_sorted(tmp_path / "full.csv"), read_sorted(tmp_path / "incremental.csv"))
+    assert build_main_data(full_dir, tmp_path / "incremental.csv", incremental=True, buckets=BUCKETS, chunksize=CHUNKSIZE) == 0
+    pd.testing.assert_frame_equal(read_sorted(tmp_path / "full.csv"), read_sorted(tmp_path / "incremental.csv"))
+
+
+def test_interrupted_append_is_truncated_on_retry(tmp_path, raw_dirs, monkeypatch):
+    full_dir, partial_dir = raw_dirs
+    build_main_data(full_dir, tmp_path / "full.csv", buckets=BUCKETS, chunksize=CHUNKSIZE)
+    build_main_data(partial_dir, tmp_path / "incremental.csv", buckets=BUCKETS, chunksize=CHUNKSIZE)
+
+    # The run dies after appending its rows but before recording them.
+    def interrupt(output_path, state):
+        raise KeyboardInterrupt
+    write_etl_state = etl.write_etl_state
+    monkeypatch.setattr(etl, "write_etl_state", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        build_main_data(full_dir, tmp_path / "incremental.csv", incremental=True, buckets=BUCKETS, chunksize=CHUNKSIZE)
+
+    monkeypatch.setattr(etl, "write_etl_state", write_etl_state)
+    build_main_data(full_dir, tmp_path / "incremental.csv", incremental=True, buckets=BUCKETS, chunksize=CHUNKSIZE)
+    pd.testing.assert_frame_equal(read_sorted(tmp_path / "full.csv"), read_sorted(tmp_path / "incremental.csv"))
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from babel.numbers import format_currency as babel_format_currency
+from babel.numbers import format_decimal as babel_format_decimal
+
+from formatting import LOCALE, MISSING_VALUE, format_count, format_currency, format_currency_values, format_decimal_values
+
+
+@pytest.mark.parametrize("value, expected", [(2.675, "R$\xa02,68"), (-12.345, "-R$\xa012,34"), (1234567.5, "R$\xa01.234.567,50")])
+def test_currency_rounds_like_babel(value, expected):
+    assert format_currency(value) == babel_format_currency(value, "BRL", locale=LOCALE) == expected
+
+
+def test_columns_match_babel():
+    rng = np.random.default_rng(0)
+    # Half way cases at the third decimal, where rounding the binary value
+    # and rounding its decimal form disagree most often.
+    values = np.concatenate([rng.integers(-10**6, 10**6, 2_000) / 1000 + 0.0005, rng.uniform(-1e6, 1e6, 2_000)]).round(3)
+    assert format_currency_values(values).tolist() == [babel_format_currency(value, "BRL", locale=LOCALE) for value in values.tolist()]
+    assert format_decimal_values(values, 2).tolist() == [babel_format_decimal(value, "#,##0.00", locale=LOCALE) for value in values.tolist()]
+
+
+def test_missing_values():
+    assert format_currency_values([np.nan, 1.0]).tolist() == [MISSING_VALUE, "R$\xa01,00"]
+    assert format_count(np.nan) == MISSING_VALUE
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+
+import pytest
+
+import parallel
+from parallel import DeferredBuild, PooledBuild, submit_build
+
+
+def count_orders(main_df):
+    return len(main_df)
+
+
+def count_orders_outside_pool(main_df):
+    # Kills the pool worker running it, which breaks the whole pool.
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return len(main_df)
+
+
+def count_orders_after_flag(main_df):
+    if not os.path.exists(os.environ["PARALLEL_TEST_FLAG"]):
+        raise RuntimeError("dataset not ready")
+    return len(main_df)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(parallel, "PARALLEL_WORKERS", 2)
+    monkeypatch.setattr(parallel, "snapshot_path", lambda name, version, columns: None)
+    yield
+    parallel._submit_build.clear()
+    parallel._executor.clear()
+
+
+def test_broken_pool_falls_back_to_building_in_process(pool, main_data_parquet):
+    future = submit_build(count_orders_outside_pool, main_data_parquet, "v1", ["order_id"])
+    assert isinstance(future, PooledBuild)
+    assert future.result() == 5_000
+
+    # Later builds get a fresh pool.
+    future = submit_build(count_orders, main_data_parquet, "v1", ["order_id"])
+    assert isinstance(future, PooledBuild)
+    assert future.result() == 5_000
+
+
+def test_failed_build_is_retried_on_next_submit(pool, main_data_parquet, tmp_path, monkeypatch):
+    flag = tmp_path / "ready"
+    monkeypatch.setenv("PARALLEL_TEST_FLAG", str(flag))
+    with pytest.raises(RuntimeError, match="dataset not ready"):
+        submit_build(count_orders_after_flag, main_data_parquet, "v1", ["order_id"]).result()
+
+    flag.touch()
+    assert submit_build(count_orders_after_flag, main_data_parquet, "v1", ["order_id"]).result() == 5_000
+
+
+def test_single_worker_defers_build(monkeypatch, main_data_parquet):
+    monkeypatch.setattr(parallel, "PARALLEL_WORKERS", 1)
+    monkeypatch.setattr(parallel, "snapshot_path", lambda name, version, columns: None)
+    future = submit_build(count_orders, main_data_parquet, "v2", ["order_id"])
+    assert isinstance(future, DeferredBuild)
+    assert future.result() == 5_000
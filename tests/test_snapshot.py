@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import snapshot
+from cube import CUBE_COLUMNS, build_order_cube
+from data_loader import file_version, read_main_data
+from snapshot import load_snapshot, save_snapshot, snapshot_path
+
+
+def test_snapshot_round_trip(tmp_path, main_data_parquet):
+    order_cube = build_order_cube(read_main_data(main_data_parquet, columns=CUBE_COLUMNS))
+    path = str(tmp_path / "cube.snapshot")
+    save_snapshot(path, order_cube)
+    loaded_cube = load_snapshot(path)
+
+    for name, rollup_df in order_cube.rollups.items():
+        pd.testing.assert_frame_equal(loaded_cube.rollups[name], rollup_df)
+    for name, registers in order_cube.sketches.items():
+        np.testing.assert_array_equal(loaded_cube.sketches[name], registers)
+        # Mapped straight from the file rather than copied.
+        assert not loaded_cube.sketches[name].flags.writeable
+
+    start_date, end_date = "2017-01-01", "2017-06-30"
+    pd.testing.assert_frame_equal(
+        loaded_cube.between(start_date, end_date).distinct_count("payment_type", ["order_year", "payment_type"]),
+        order_cube.between(start_date, end_date).distinct_count("payment_type", ["order_year", "payment_type"]),
+    )
+
+
+def test_saving_removes_stale_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path))
+    old_path = snapshot_path("cube.build_order_cube", "v1", ["order_id"])
+    other_path = snapshot_path("rfm.create_rfm_df", "v1", ["order_id"])
+    save_snapshot(old_path, np.arange(3))
+    save_snapshot(other_path, np.arange(3))
+
+    new_path = snapshot_path("cube.build_order_cube", "v2", ["order_id"])
+    save_snapshot(new_path, np.arange(4))
+    assert sorted(tmp_path.iterdir()) == sorted([tmp_path / os.path.basename(new_path), tmp_path / os.path.basename(other_path)])
+
+
+def test_file_hashes_are_reused_by_a_fresh_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(data_loader, "_file_hashes", None)
+    path = tmp_path / "main_data.csv"
+    path.write_text("order_id\na\n")
+    version = file_version(str(path))
+
+    # Same size and mtime: only a hash that was saved can give the old version.
+    stat = os.stat(path)
+    path.write_text("order_id\nb\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    monkeypatch.setattr(data_loader, "_file_hashes", None)
+    assert file_version(str(path)) == version
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert file_version(str(path)).split("-")[1] != version.split("-")[1]